@@ -3,7 +3,8 @@ import math
 import html
 import streamlit as st
 import pandas as pd
-from collections import defaultdict
+from collections import defaultdict, deque
+from src.copilot.context_bridge import family_context
 
 # ===== 網站 & Email =====
 FOOTER_SITE  = "https://gracefo.com"
@@ -134,33 +135,80 @@ CELL_W, CELL_H = 160, 84
 H_GAP, V_GAP   = 36, 70
 RADIUS         = 12
 
-def build_generations(fam):
-    """由親子關係推到代別；不足則用關係 fallback。"""
+GEN_FALLBACK={"本人":0,"配偶(現任)":0,"前配偶":0,"伴侶":0,"子女":1,"子女之配偶":1,"孫子":2,"孫女":2,"孫輩之配偶":2}
+
+def parent_edges(fam):
+    """[(父/母, 子女, 欄位)]；只取名單內找得到的人"""
     people={m["name"] for m in fam}
-    parent_of=defaultdict(set); child_of=defaultdict(set)
+    edges=[]
     for m in fam:
-        n=m["name"]; f,mo=N(m.get("father","")),N(m.get("mother",""))
-        if f in people: parent_of[f].add(n); child_of[n].add(f)
-        if mo in people: parent_of[mo].add(n); child_of[n].add(mo)
+        for field in ("father","mother"):
+            p=N(m.get(field,""))
+            if p in people: edges.append((p, m["name"], field))
+    return edges
+
+def find_cycle_edges(fam, edges):
+    """親子關係的循環（例：A 是 B 的父親、B 又是 A 的父親）：
+       先依入度剝掉沒有祖先問題的人（Kahn），再依出度剝掉只是循環後代的人，剩下的就在循環上。O(V+E)"""
+    indeg=defaultdict(int); outdeg=defaultdict(int); kids=defaultdict(list); parents=defaultdict(list)
+    for p,c,_ in edges:
+        indeg[c]+=1; outdeg[p]+=1; kids[p].append(c); parents[c].append(p)
+    alive={m["name"] for m in fam}
+    q=deque(n for n in alive if indeg[n]==0)
+    while q:
+        n=q.popleft(); alive.discard(n)
+        for c in kids[n]:
+            indeg[c]-=1
+            if indeg[c]==0: q.append(c)
+    for n in alive:
+        outdeg[n]=sum(1 for c in kids[n] if c in alive)
+    q=deque(n for n in alive if outdeg[n]==0)
+    while q:
+        n=q.popleft(); alive.discard(n)
+        for p in parents[n]:
+            if p in alive:
+                outdeg[p]-=1
+                if outdeg[p]==0: q.append(p)
+    return [e for e in edges if e[0] in alive and e[1] in alive]
+
+def build_generations(fam):
+    """由親子關係推到代別（BFS，每條親子邊只看兩次，O(V+E)）；回傳 (代別, 問題清單)。
+       「本人」為第 0 代往外推；與本人不相連的分支以關係 fallback 定錨後同樣往外推。
+       每人只指定一次代別（先到先定，不會來回翻動）；循環或互相矛盾的親子邊列入問題清單。"""
+    rel={m["name"]:m.get("relation","其他") for m in fam}
+    edges=parent_edges(fam)
+    adj=defaultdict(list)  # name -> [(另一人, 代別差, 邊)]
+    for e in edges:
+        p,c,_=e
+        adj[p].append((c,1,e)); adj[c].append((p,-1,e))
+
+    issues=[]; reported=set()
+    for e in find_cycle_edges(fam, edges):
+        reported.add(e)
+        issues.append({"child":e[1], "field":e[2], "value":e[0], "problem":"親子關係形成循環"})
+
     gen={}
-    for m in fam:
-        if m.get("relation")=="本人": gen[m["name"]]=0
-    changed=True; loops=0
-    while changed and loops<10*max(1,len(fam)):
-        changed=False; loops+=1
-        for p,kids in parent_of.items():
-            if p in gen:
-                for k in kids:
-                    want=gen[p]+1
-                    if gen.get(k)!=want: gen[k]=want; changed=True
-        for c,ps in child_of.items():
-            if c in gen:
-                for p in ps:
-                    want=gen[c]-1
-                    if gen.get(p)!=want: gen[p]=want; changed=True
-    FALLBACK={"本人":0,"配偶(現任)":0,"前配偶":0,"伴侶":0,"子女":1,"子女之配偶":1,"孫子":2,"孫女":2,"孫輩之配偶":2}
-    for m in fam: gen.setdefault(m["name"], FALLBACK.get(m.get("relation","其他"),0))
-    return gen
+    def spread(seeds):
+        q=deque(seeds)
+        while q:
+            u=q.popleft()
+            for v,d,e in adj[u]:
+                want=gen[u]+d
+                if v not in gen:
+                    gen[v]=want; q.append(v)
+                elif gen[v]!=want and e not in reported:
+                    reported.add(e); p,c,_=e
+                    issues.append({"child":c, "field":e[2], "value":p,
+                                   "problem":f"代別矛盾（父/母在第 {gen[p]} 代、子女在第 {gen[c]} 代）"})
+
+    seeds=[n for n in rel if rel[n]=="本人"]
+    for n in seeds: gen[n]=0
+    spread(seeds)
+    # 其餘分支：優先用關係有 fallback 的人定錨
+    for n in [n for n in rel if rel[n] in GEN_FALLBACK]+[n for n in rel if rel[n] not in GEN_FALLBACK]:
+        if n not in gen:
+            gen[n]=GEN_FALLBACK.get(rel[n],0); spread([n])
+    return gen, issues
 
 def generation_orders(fam, gen_map, unions):
     """同代排序：
@@ -232,14 +280,14 @@ def generation_orders(fam, gen_map, unions):
 
 def layout_independent(fam, unions):
     people={m["name"]:m for m in fam}
-    gen = build_generations(fam)
+    gen, issues = build_generations(fam)
     orders = generation_orders(fam, gen, unions)
 
     pos={}
     for g, order in orders.items():
         for i,n in enumerate(order):
             pos[n]=(float(i), g)
-    return pos, gen
+    return pos, gen, issues
 
 def draw_svg(fam, unions, pos, gen):
     people={m["name"]:m for m in fam}
@@ -326,10 +374,16 @@ def draw_svg(fam, unions, pos, gen):
     return "\n".join(svg)
 
 # === 產生與繪製 ===
-pos, gen = layout_independent(st.session_state.family, st.session_state.unions)
+pos, gen, gen_issues = layout_independent(st.session_state.family, st.session_state.unions)
 svg = draw_svg(st.session_state.family, st.session_state.unions, pos, gen)
 st.markdown(svg, unsafe_allow_html=True)
 
+# 給 Copilot 頁帶入（示範資料未修改時不帶，避免把範例家族當成訪客的家族）
+if st.session_state.family and (st.session_state.family != DEMO_FAMILY or st.session_state.unions):
+    st.session_state.family_context = family_context(st.session_state.family, st.session_state.unions)
+else:
+    st.session_state.pop("family_context", None)
+
 # ===== 檢查小工具：幫你快速抓錯誤填寫的父/母 =====
 st.divider()
 st.subheader("🔎 親子關係檢查（快速檢核父/母是否填錯）")
@@ -342,6 +396,7 @@ if st.session_state.family:
             issues.append({"child":m["name"], "field":"father", "value":f, "problem":"找不到此人"})
         if mo and mo not in name_set:
             issues.append({"child":m["name"], "field":"mother", "value":mo, "problem":"找不到此人"})
+    issues.extend(gen_issues)  # 循環 / 代別矛盾（由代別推算時一併找出）
     if issues:
         st.warning("發現可能的填寫問題：")
         st.dataframe(pd.DataFrame(issues), use_container_width=True)
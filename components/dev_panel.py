@@ -0,0 +1,58 @@
+from __future__ import annotations
+import pandas as pd
+import streamlit as st
+from src.telemetry.tracing import enable_persistence, reset_spans, span_summary
+
+def app_env() -> str:
+    try:
+        return str(st.secrets.get("app_env", "")).lower()
+    except Exception:
+        return ""
+
+def configure_tracing() -> None:
+    """secrets [tracing] persist = true 時，每 interval 秒把各階段分位數寫一筆 span_summary 事件"""
+    try:
+        cfg = dict(st.secrets.get("tracing", {}))
+    except Exception:
+        cfg = {}
+    if cfg.get("persist", False):
+        from src.repos.leads_repo import log_event
+        enable_persistence(lambda summary: log_event("span_summary", payload=summary), float(cfg.get("interval", 60)))
+
+def render_dev_panel() -> None:
+    """隱藏的效能面板：只有 secrets 設 app_env = "dev" 時才顯示"""
+    if app_env() != "dev":
+        return
+    with st.expander("🛠️ 效能與快取（dev）", expanded=False):
+        summary = span_summary()
+        if summary:
+            df = pd.DataFrame.from_dict(summary, orient="index")
+            df.index.name = "span"
+            st.dataframe(df, use_container_width=True)
+        else:
+            st.caption("尚無計時資料。")
+
+        from src.copilot.answer_cache import get_answer_cache
+        from src.copilot.rate_limit import get_rate_limiter
+        from src.repos.leads_repo import event_buffer_stats
+        from src.report.pdf_cache import get_pdf_cache
+        from src.report.render_queue import get_render_queue
+        from src.tax.simulator import scenario_cache_stats
+        c1, c2 = st.columns(2)
+        with c1:
+            st.caption("模擬結果快取")
+            st.json(scenario_cache_stats().as_dict())
+            st.caption("事件緩衝")
+            st.json(event_buffer_stats())
+            st.caption("Copilot 問答快取")
+            st.json(get_answer_cache().stats())
+        with c2:
+            st.caption("PDF 快取")
+            st.json(get_pdf_cache().stats())
+            st.caption("PDF 產生佇列")
+            st.json(get_render_queue().stats())
+            st.caption("Copilot 全域限流")
+            st.json(get_rate_limiter().stats())
+        if st.button("重設計時資料", key="dev_reset_spans"):
+            reset_spans()
+            st.rerun()
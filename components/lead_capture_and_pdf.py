@@ -1,11 +1,19 @@
 from __future__ import annotations
+import time
 from typing import Dict, Any, Optional
 import streamlit as st
-from src.repos.leads_repo import save_lead, log_event
-from src.report.report_builder import build_pdf
+from src.repos.leads_repo import log_event
+from src.repos.leads_repo_async import submit, upsert_lead_async
+from src.report.pdf_cache import report_cache_key
+from src.report.render_queue import RenderJob, get_render_queue
+from src.telemetry.tracing import record, span
+from components.dev_panel import configure_tracing, render_dev_panel
+
+_PDF_JOB_KEY = "lead_pdf_job"
 
 def lead_capture_and_pdf(*, inputs_summary: Dict[str, Any], result_summary: Dict[str, Any], comparisons: Optional[Dict[str, Any]], recommendations: Dict[str, Any], tag: str = "tax_tool", case_id: Optional[str] = None):
     brand = st.secrets.get("brand", {})
+    configure_tracing()
     invite_code_cfg = brand.get("invite_code", "")
 
     # 邀請碼（若設定）
@@ -40,26 +48,93 @@ def lead_capture_and_pdf(*, inputs_summary: Dict[str, Any], result_summary: Dict
         agree = cols2[1].checkbox("我同意接收報告與後續規劃建議（可隨時取消）", value=True)
         submitted = st.form_submit_button("產生專屬 PDF")
 
+    compact = bool(brand.get("compact_pdf", False))
+    # 已產生的報告記住它的內容 key；輸入改變後不再顯示舊報告的下載按鈕
+    content_key = report_cache_key(
+        inputs_summary=inputs_summary, result_summary=result_summary,
+        recommendations=recommendations, comparisons=comparisons,
+        brand=dict(brand), compact=compact,
+    )
+    job_key = f"{_PDF_JOB_KEY}:{tag}"
+    if st.session_state.get(job_key, {}).get("content_key") != content_key:
+        st.session_state.pop(job_key, None)
+
     if submitted:
         if not email or "@" not in email:
             st.error("請輸入有效的 Email。")
             return
+        t_submit = time.perf_counter()
         payload = {
             "inputs": inputs_summary,
             "result": result_summary,
             "comparisons": comparisons,
             "recommendations": recommendations,
         }
-        lead_id = save_lead(name=name or None, email=email.strip(), phone=phone or None, case_id=case_id, tag=tag, payload=payload)
-        st.success(f"已建立報告（Lead #{lead_id}）。")
-        log_event("submit_form", ref_id=lead_id, payload=payload)
-
-        pdf_bytes = build_pdf(inputs_summary=inputs_summary, result_summary=result_summary, comparisons=comparisons, recommendations=recommendations)
-        log_event("download_pdf", ref_id=lead_id, payload={"bytes": len(pdf_bytes)})
-
-        st.download_button(
-            label="⬇️ 下載 PDF 報告",
-            data=pdf_bytes,
-            file_name="永傳_顧問建議報告.pdf",
-            mime="application/pdf",
+        # PDF 丟到背景佇列產生（內容相同時直接取快取）；同時寫入 lead（背景事件迴圈），只等 lead id 就返回
+        # 精簡模式預設關閉（保留粗體與完整解析度 logo）；寄送用可在 secrets 設 brand.compact_pdf = true
+        lead_future = submit(upsert_lead_async(name=name or None, email=email.strip(), phone=phone or None, case_id=case_id, tag=tag, payload=payload))
+
+        def _log_download(job: RenderJob) -> None:
+            event = {"queue_ms": job.queue_ms, "cache": job.cache_tier, "cache_hit": job.cache_tier not in ("", "miss")}
+            if job.report is not None:
+                event.update(bytes=job.report.size, render_ms=job.report.render_ms, compact=job.report.compact)
+            if job.error:
+                event["error"] = job.error
+
+            # 在 render worker 上執行：不等 lead 寫入，等 lead id 出來（或寫入失敗）時才記事件
+            def _log(fut) -> None:
+                lead_id = None if fut.cancelled() or fut.exception() is not None else fut.result()[0]
+                log_event("download_pdf", ref_id=lead_id, payload=event)
+
+            lead_future.add_done_callback(_log)
+
+        job_id = get_render_queue().submit(
+            inputs_summary=inputs_summary, result_summary=result_summary,
+            comparisons=comparisons, recommendations=recommendations,
+            brand=brand,
+            compact=compact,
+            template=True,
+            on_done=_log_download,
         )
+
+        with span("lead.wait_lead_id"):
+            lead_id, created = lead_future.result()
+        if created:
+            log_event("submit_form", ref_id=lead_id, payload=payload)
+        else:  # 重複送出：lead 已存有同一份 payload，只記一筆不帶內容的事件
+            log_event("submit_form_duplicate", ref_id=lead_id)
+        st.session_state[job_key] = {"job_id": job_id, "lead_id": lead_id, "content_key": content_key}
+        record("lead.submit", (time.perf_counter() - t_submit) * 1000)
+
+    job_ref = st.session_state.get(job_key)
+    if job_ref:
+        st.success(f"已建立報告（Lead #{job_ref['lead_id']}）。")
+        job = get_render_queue().get(job_ref["job_id"])
+        if job is not None and not job.finished:
+            _poll_pdf_job(job_ref["job_id"])
+        else:
+            _pdf_download(job)
+
+    render_dev_panel()
+
+@st.fragment(run_every=0.5)
+def _poll_pdf_job(job_id: str) -> None:
+    """只重跑這一小段（不重跑整頁）直到報告完成，再整頁重跑以顯示下載按鈕"""
+    job = get_render_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.info("報告產生中…" if job.status == "running" else f"排隊中（已等待 {job.queue_ms / 1000:.1f} 秒）…")
+
+def _pdf_download(job: Optional[RenderJob]) -> None:
+    if job is None:
+        st.warning("報告已逾時，請重新按「產生專屬 PDF」。")
+        return
+    if job.report is None:
+        st.error("報告產生失敗，請稍後再試。")
+        return
+    st.download_button(
+        label="⬇️ 下載 PDF 報告",
+        data=job.report.data,
+        file_name="永傳_顧問建議報告.pdf",
+        mime="application/pdf",
+    )
@@ -1,13 +1,20 @@
 # pages/02_Tax_Path_Simulator.py
 from __future__ import annotations
 import re
-from typing import Dict, Any, Tuple
+from typing import List, Tuple
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 
 from components.lead_capture_and_pdf import lead_capture_and_pdf
-from src.tax.tw_estate import calculate_estate_tax_2025  # 依照你剛新增的模組
+from src.copilot.context_bridge import scenario_context
+from src.tax.simulator import (
+    SimInputs, run_simulation_cached,
+    SWEEP_AXES, MAX_SWEEP_STEPS, sensitivity_grid,
+)
+from src.tax.tw_estate import B1, B2, gift_to_reach_bracket, gift_to_reach_tax
+from src.tax.projection import AssetGrowth, ProjectionConfig, project_estate_tax
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 基本設定
@@ -23,31 +30,91 @@ def sanitize_plus(s: str) -> str:
     """將『配偶＋二子女』等 +/＋ 改成頓號，避免誤讀"""
     return re.sub(r"[+＋]", "、", s)
 
-def derive_kpi(comparisons: Dict[str, Dict[str, Any]]) -> Tuple[str, int, int, str]:
-    """從情境比較推 KPI：最佳方案 / 節省金額 / 基準稅額 / 降幅%"""
-    # 找 baseline
-    base_key = None
-    for k in comparisons:
-        if "不規劃" in k or "基準" in k:
-            base_key = k
-            break
-    if base_key is None:
-        base_key = max(comparisons, key=lambda x: comparisons[x].get("total_tax", 0))
-
-    base_tax = int(comparisons[base_key].get("total_tax", 0))
-    # 找最低
-    best_key = min(comparisons, key=lambda x: comparisons[x].get("total_tax", 10**9))
-    best_tax = int(comparisons[best_key].get("total_tax", 0))
-    saved = max(base_tax - best_tax, 0)
-    pct = f"{round(saved / base_tax * 100)}%" if base_tax > 0 else "-"
-    return best_key, saved, base_tax, pct
-
-def liquidity_gap(tax_need_10k: int, cash_10k: int) -> Tuple[int, str]:
-    """流動性缺口（需要稅源 - 現金），<0 表足額"""
-    gap = tax_need_10k - cash_10k
-    if gap <= 0:
-        return 0, "現金足以覆蓋稅款"
-    return gap, f"現金不足 {gap} 萬，建議規劃稅源池（保單/信託）"
+def sweep_values(sim: SimInputs, axis: str, pct_range: Tuple[int, int], steps: int) -> List[int]:
+    """敏感度分析的軸取值：資產類以目前金額的百分比區間均分，子女數取 0–10 人"""
+    field = SWEEP_AXES[axis]
+    if field == "adult_children":
+        return list(range(0, 11))
+    base = getattr(sim, field) or sim.total_10k  # 目前為 0 時改以總資產為基準
+    lo = base * (100 + pct_range[0]) / 100
+    hi = base * (100 + pct_range[1]) / 100
+    vals = sorted({int(round(lo + (hi - lo) * i / max(steps - 1, 1))) for i in range(steps)})
+    return [max(v, 0) for v in vals]
+
+def render_sensitivity(sim: SimInputs) -> None:
+    """2-D 敏感度熱圖（一次向量化算完整張網格）＋累進級距分界線"""
+    c1, c2, c3 = st.columns(3)
+    axes = list(SWEEP_AXES)
+    x_axis = c1.selectbox("橫軸", axes, index=0, key="sens_x")
+    y_axis = c2.selectbox("縱軸", [a for a in axes if a != x_axis], index=0, key="sens_y")
+    metric = c3.selectbox("顯示指標", ["基準稅額", "最佳方案稅額", "預估可節省", "現金稅源缺口"], key="sens_metric")
+    c4, c5 = st.columns(2)
+    pct_range = c4.slider("資產變動區間（%）", -80, 200, (-50, 50), step=5, key="sens_pct")
+    steps = c5.slider("每軸格數", 10, MAX_SWEEP_STEPS, 60, step=10, key="sens_steps")
+
+    xs = sweep_values(sim, x_axis, pct_range, steps)
+    ys = sweep_values(sim, y_axis, pct_range, steps)
+    grid = sensitivity_grid(sim, x_axis, xs, y_axis, ys)
+    values = {
+        "基準稅額": grid.base_tax_10k,
+        "最佳方案稅額": grid.best_tax_10k,
+        "預估可節省": grid.saved_10k,
+        "現金稅源缺口": grid.gap_10k,
+    }[metric]
+
+    def cell_edges(v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # 每格以相鄰取值的中點為邊界，畫成連續的熱圖
+        mid = (v[1:] + v[:-1]) / 2 if len(v) > 1 else np.array([], dtype=float)
+        half = (v[1] - v[0]) / 2 if len(v) > 1 else 0.5
+        return np.concatenate([[v[0] - half], mid]), np.concatenate([mid, [v[-1] + half]])
+
+    x0, x1 = cell_edges(grid.x_values.astype(float))
+    y0, y1 = cell_edges(grid.y_values.astype(float))
+    ny, nx = values.shape
+    df = pd.DataFrame({
+        "x": np.tile(grid.x_values, ny), "y": np.repeat(grid.y_values, nx),
+        "x0": np.tile(x0, ny), "x1": np.tile(x1, ny),
+        "y0": np.repeat(y0, nx), "y1": np.repeat(y1, nx),
+        "value": values.ravel(),
+        "bracket": grid.bracket.ravel() + 1,
+        "edge": grid.bracket_edge.ravel(),
+    })
+    current = {"x": getattr(sim, SWEEP_AXES[x_axis]), "y": getattr(sim, SWEEP_AXES[y_axis])}
+    unit = lambda axis: "（人）" if SWEEP_AXES[axis] == "adult_children" else "（萬元）"
+
+    spec = {
+        "height": 420,
+        "layer": [
+            {
+                "mark": {"type": "rect"},
+                "encoding": {
+                    "x": {"field": "x0", "type": "quantitative", "title": x_axis + unit(x_axis)},
+                    "x2": {"field": "x1"},
+                    "y": {"field": "y0", "type": "quantitative", "title": y_axis + unit(y_axis)},
+                    "y2": {"field": "y1"},
+                    "color": {"field": "value", "type": "quantitative", "title": f"{metric}（萬）", "scale": {"scheme": "tealblues"}},
+                    "tooltip": [
+                        {"field": "x", "title": x_axis}, {"field": "y", "title": y_axis},
+                        {"field": "value", "title": metric}, {"field": "bracket", "title": "級距"},
+                    ],
+                },
+            },
+            {
+                # 級距分界：與相鄰格落在不同稅率級距的格子
+                "transform": [{"filter": "datum.edge"}],
+                "mark": {"type": "rect", "color": "#F59E0B", "opacity": 0.9},
+                "encoding": {"x": {"field": "x0", "type": "quantitative"}, "x2": {"field": "x1"},
+                             "y": {"field": "y0", "type": "quantitative"}, "y2": {"field": "y1"}},
+            },
+            {
+                "data": {"values": [current]},
+                "mark": {"type": "point", "shape": "diamond", "size": 120, "filled": True, "color": "#DC2626"},
+                "encoding": {"x": {"field": "x", "type": "quantitative"}, "y": {"field": "y", "type": "quantitative"}},
+            },
+        ],
+    }
+    st.vega_lite_chart(df, spec, use_container_width=True)
+    st.caption("橘色為 10% / 15% / 20% 累進級距分界；紅色菱形為目前輸入。其餘欄位維持目前設定（示意）。")
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 表單：家庭與資產
@@ -98,50 +165,32 @@ with st.form("qna_form"):
 
     submitted = st.form_submit_button("⚙️ 產生模擬結果")
 
-if not submitted:
+# 送出後把正規化的輸入存進 session：之後下方留資表單觸發的 rerun 仍能顯示結果（由快取直接取）
+if submitted:
+    st.session_state.sim_inputs = SimInputs.normalize(
+        members=members, overseas=overseas, prefer=prefer,
+        has_spouse=has_spouse, adult_children=adult_children, parents=parents,
+        disabled_people=disabled_people, other_dependents=other_dependents,
+        realty=realty, equities=equities, cash=cash,
+    )
+    st.session_state.sim_heirs = heirs
+
+sim: SimInputs | None = st.session_state.get("sim_inputs")
+if sim is None:
     st.info("請完成上方 3 個步驟後，按下「⚙️ 產生模擬結果」。")
     st.stop()
 
 # ────────────────────────────────────────────────────────────────────────────────
-# 模擬計算（正式：2025 遺產稅三級距＋扣除）
+# 模擬計算（正式：2025 遺產稅三級距＋扣除；相同輸入由快取直接取用）
 # ────────────────────────────────────────────────────────────────────────────────
-total_10k = int(realty + equities + cash)
-if total_10k <= 0:
+if sim.total_10k <= 0:
     st.error("資產總額需大於 0。")
     st.stop()
 
-taxable_10k, base_tax_10k, deduct_10k = calculate_estate_tax_2025(
-    total_10k,
-    has_spouse=has_spouse,
-    adult_children=int(adult_children),
-    parents=int(parents),
-    disabled_people=int(disabled_people),
-    other_dependents=int(other_dependents),
-)
-
-# 三情境（效果係數示意；後續可逐步替換成精算模型）
-def simulate_scenarios(prefer: str, overseas: str, base_tax_10k: int) -> Dict[str, Dict[str, Any]]:
-    save_policy = 0.55
-    save_trust  = 0.48
-    if prefer == "節稅優先":
-        save_policy += 0.03; save_trust += 0.02
-    elif prefer == "降低家族爭議":
-        save_trust  += 0.03
-    if overseas != "無":
-        save_trust  += 0.03
-
-    policy_tax = max(int(round(base_tax_10k * (1 - save_policy))), 0)
-    trust_tax  = max(int(round(base_tax_10k * (1 - save_trust))),  0)
-
-    return {
-        "不規劃（基準）": {"total_tax": base_tax_10k, "note": "依法課稅（2025 正式級距，含免稅與扣除）。"},
-        "保單規劃":       {"total_tax": policy_tax,   "note": "以保單現金價值預留稅源池、提升流動性（示意）。"},
-        "信託規劃":       {"total_tax": trust_tax,    "note": "信託條款可納教育/慈善與跨境合規（示意）。"},
-    }
-
-comparisons = simulate_scenarios(prefer, overseas, base_tax_10k)
-best_key, saved_10k, base_tax_show_10k, pct = derive_kpi(comparisons)
-gap_10k, gap_note = liquidity_gap(base_tax_show_10k, int(cash))
+res = run_simulation_cached(sim)
+comparisons = res.comparisons
+# 最新結果給 Copilot 頁帶入，訪客問問題時不必再說明一次家庭與資產
+st.session_state.sim_context = scenario_context(sim, res, heirs=sanitize_plus(st.session_state.get("sim_heirs", "")))
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 顯示結果（KPI + 圖表 + 計算基礎）
@@ -150,13 +199,13 @@ st.success("✅ 模擬完成：以下是您的差距與建議")
 
 k1, k2, k3, k4 = st.columns(4)
 with k1:
-    st.metric("最佳方案（示意）", best_key)
+    st.metric("最佳方案（示意）", res.best_key)
 with k2:
-    st.metric("基準稅額", f"{base_tax_show_10k} 萬")
+    st.metric("基準稅額", f"{res.base_tax_show_10k} 萬")
 with k3:
-    st.metric("預估可節省", f"{saved_10k} 萬", pct)
+    st.metric("預估可節省", f"{res.saved_10k} 萬", res.pct)
 with k4:
-    st.metric("現金稅源缺口", f"{gap_10k} 萬")
+    st.metric("現金稅源缺口", f"{res.gap_10k} 萬")
 
 df = pd.DataFrame(
     {"情境": list(comparisons.keys()),
@@ -166,35 +215,79 @@ st.bar_chart(df, x="情境", y="稅費合計_萬元", use_container_width=True)
 
 with st.expander("🧾 計算基礎（免稅與扣除）", expanded=False):
     st.write(
-        f"- 課稅遺產淨額：{taxable_10k} 萬\n"
-        f"- 扣除總額：{deduct_10k} 萬（含免稅 1333 萬、喪葬 138 萬、配偶/子女/父母/身障/其他受扶養等）"
+        f"- 課稅遺產淨額：{res.taxable_10k} 萬\n"
+        f"- 扣除總額：{res.deduct_10k} 萬（含免稅 1333 萬、喪葬 138 萬、配偶/子女/父母/身障/其他受扶養等）"
+    )
+
+with st.expander("🎯 反推：需先移轉多少資產？", expanded=False):
+    deductions = dict(
+        has_spouse=sim.has_spouse, adult_children=sim.adult_children, parents=sim.parents,
+        disabled_people=sim.disabled_people, other_dependents=sim.other_dependents,
     )
+    g1, g2, g3 = st.columns(3)
+    g1.metric(f"課稅淨額降至 {B1 // 10_000} 萬（10% 級距）", f"{gift_to_reach_bracket(sim.total_10k, 0, **deductions)} 萬")
+    g2.metric(f"課稅淨額降至 {B2 // 10_000} 萬（15% 級距）", f"{gift_to_reach_bracket(sim.total_10k, 1, **deductions)} 萬")
+    g3.metric("遺產稅降為 0", f"{gift_to_reach_tax(sim.total_10k, 0, **deductions)} 萬")
+    target = st.number_input("目標遺產稅（萬元）", min_value=0, value=int(res.base_tax_10k // 2), step=10, key="inv_target")
+    st.write(f"若希望遺產稅不超過 **{int(target)} 萬**，需先移轉約 **{gift_to_reach_tax(sim.total_10k, int(target), **deductions)} 萬**（以目前扣除條件計算，未含贈與稅，示意）。")
+
+with st.expander("📈 敏感度分析（例：不動產增值 20% 會怎樣？）", expanded=False):
+    render_sensitivity(sim)
+
+with st.expander("🔮 未來資產成長試算（蒙地卡羅）", expanded=False):
+    PRESETS = {
+        "保守": (AssetGrowth(0.02, 0.08), AssetGrowth(0.04, 0.15)),
+        "中性": (AssetGrowth(0.03, 0.12), AssetGrowth(0.06, 0.20)),
+        "積極": (AssetGrowth(0.04, 0.15), AssetGrowth(0.08, 0.25)),
+    }
+    m1, m2, m3 = st.columns(3)
+    preset = m1.selectbox("成長假設（不動產 / 股票）", list(PRESETS), index=1, key="mc_preset")
+    years = m2.slider("試算年數", 5, 40, 30, key="mc_years")
+    n_paths = m3.select_slider("模擬路徑數", [10_000, 20_000, 50_000, 100_000], value=20_000, key="mc_paths")
+    # 結果連同產生它的輸入一起存：表單重新送出或改了試算參數後，不會把舊的試算當成新結果顯示
+    mc_key = (sim, preset, years, n_paths)
+    if st.button("執行試算", key="mc_run"):
+        realty_g, equities_g = PRESETS[preset]
+        st.session_state.mc_result = (mc_key, project_estate_tax(
+            realty_10k=sim.realty, equities_10k=sim.equities, cash_10k=sim.cash,
+            config=ProjectionConfig(years=years, paths=n_paths, realty=realty_g, equities=equities_g, seed=2025),
+            has_spouse=sim.has_spouse, adult_children=sim.adult_children, parents=sim.parents,
+            disabled_people=sim.disabled_people, other_dependents=sim.other_dependents,
+        ))
+    stored = st.session_state.get("mc_result")
+    proj = stored[1] if stored is not None and stored[0] == mc_key else None
+    if stored is not None and proj is None:
+        st.caption("輸入或試算參數已變更，請重新按「執行試算」。")
+    if proj is not None:
+        mc_df = pd.DataFrame({"年後": proj.horizons, **{f"P{int(p)}": v for p, v in proj.tax_percentiles_10k.items()}})
+        st.line_chart(mc_df, x="年後", y=[c for c in mc_df.columns if c != "年後"], use_container_width=True)
+        last = len(proj.horizons) - 1
+        e1, e2, e3 = st.columns(3)
+        e1.metric(f"{proj.horizons[last]} 年後稅額中位數", f"{int(proj.tax_percentiles_10k[50][last])} 萬")
+        e2.metric("現金不足以繳稅的機率", f"{proj.gap_probability[last] * 100:.0f}%")
+        e3.metric("平均稅源缺口", f"{int(proj.mean_gap_10k[last])} 萬")
+        st.caption("以幾何布朗運動模擬不動產 / 股票 / 現金成長，逐年套用 2025 遺產稅級距（示意，非投資預測）。")
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 報告下載（Email 留存 → PDF）
 # ────────────────────────────────────────────────────────────────────────────────
 inputs_summary = {
-    "家庭成員": "、".join(members) if members else "（未填）",
-    "資產配置": f"不動產 {realty}、股票 {equities}、現金 {cash}（萬元）",
-    "海外資產": overseas,
-    "偏好": prefer,
-    "分配意向": sanitize_plus(heirs),
-    "扣除摘要": f"配偶:{'有' if has_spouse else '無'}、成子女:{int(adult_children)}、父母:{int(parents)}、"
-               f"身障:{int(disabled_people)}、其他受扶養:{int(other_dependents)}",
-}
-result_summary = {
-    "最佳方案（示意）": best_key,
-    "基準稅額": f"{base_tax_show_10k} 萬",
-    "預估可節省": f"{saved_10k} 萬（{pct}）",
-    "現金稅源檢視": gap_note,
+    "家庭成員": "、".join(sim.members) if sim.members else "（未填）",
+    "資產配置": f"不動產 {sim.realty}、股票 {sim.equities}、現金 {sim.cash}（萬元）",
+    "海外資產": sim.overseas,
+    "偏好": sim.prefer,
+    "分配意向": sanitize_plus(st.session_state.get("sim_heirs", "")),
+    "扣除摘要": f"配偶:{'有' if sim.has_spouse else '無'}、成子女:{sim.adult_children}、父母:{sim.parents}、"
+               f"身障:{sim.disabled_people}、其他受扶養:{sim.other_dependents}",
 }
+result_summary = res.result_summary
 recommendations = {
     "短期": "先建立可支用之稅源池（如：具有現金價值之保單），避免臨時處分核心資產（示意）。",
     "中期": "導入家族信託（含教育/創業/慈善條款），提升治理與跨境合規（示意）。",
     "長期": "制定家族憲章與董事會制度，結合股權安排維持控制與公平（示意）。",
 }
 
-pdf_comparisons = {k: {"total_tax": int(v["total_tax"]), "note": v.get("note", "")} for k, v in comparisons.items()}
+pdf_comparisons = res.pdf_comparisons
 
 st.markdown("---")
 st.subheader("📄 下載您的顧問級報告（免費）")
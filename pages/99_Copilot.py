@@ -1,9 +1,16 @@
 # pages/99_Copilot.py
 import time
 import streamlit as st
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from openai import OpenAI, RateLimitError
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
+from openai import APIConnectionError, APIStatusError, InternalServerError, RateLimitError
+from components.dev_panel import render_dev_panel
+from src.copilot.answer_cache import get_answer_cache
+from src.copilot.client import get_chat_client
+from src.copilot.context_bridge import render_context
+from src.copilot.history import HistoryState, build_history
+from src.copilot.rate_limit import RateLimitTimeout, estimate_tokens, get_rate_limiter
 from src.repos.leads_repo import log_event
+from src.telemetry.tracing import record
 
 # ====== 基本設定 ======
 st.set_page_config(page_title="永傳顧問 AI", page_icon="🤖", layout="wide")
@@ -14,8 +21,11 @@ MODEL_NAME = "gpt-5-nano"
 
 # 使用者體驗與穩定性參數
 COOLDOWN_SECONDS = 8      # 兩次送出間最短間隔（避免連點造成限流）
-HISTORY_TURNS = 6         # 僅保留最近 N 輪對話（壓 token）
+HISTORY_TOKENS = 1500     # 完整帶入的歷史訊息 token 上限（超過的舊輪次併入摘要）
+MEMORY_TOKENS = 300       # 舊輪次摘要的 token 上限
 MAX_TOKENS = 512          # 回覆上限（避免過長）
+STREAM_REPLY = True       # 逐字串流顯示回覆（False 則等整段回覆完成才顯示）
+RATE_WAIT_SECONDS = 20    # 全域限流排隊最多等幾秒（額度設定見 src/copilot/rate_limit.py）
 
 # 內部除錯訊息開關（在 Secrets 設 app_env="dev" 才顯示）
 APP_ENV = st.secrets.get("app_env", "").lower()
@@ -24,7 +34,7 @@ APP_ENV = st.secrets.get("app_env", "").lower()
 SYS_PROMPT = (
     "你是永傳家族辦公室的顧問 AI。用語要溫暖、專業、簡潔。"
     "聚焦台灣高資產族群的退休與傳承，回答時要：\n"
-    "1) 先釐清情境（家庭結構、資產配置、跨境、偏好）\n"
+    "1) 先釐清情境（家庭結構、資產配置、跨境、偏好）；若已附上訪客資料，直接引用數字，只詢問缺少的部分\n"
     "2) 提供 3 步行動建議（含保單/信託/贈與的方向）\n"
     "3) 結尾給 CTA：下載顧問報告 / 預約諮詢。\n"
 )
@@ -34,6 +44,20 @@ if "chat" not in st.session_state:
     st.session_state.chat = []  # list[tuple(role, content)]
 if "last_call_ts" not in st.session_state:
     st.session_state.last_call_ts = 0.0
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = HistoryState()  # 每則訊息的 token 數快取 + 滾動摘要
+
+# ====== 帶入站內試算資料（傳承路徑模擬 / 家族樹） ======
+def visitor_context() -> str:
+    if not st.session_state.get("use_visitor_context", True):
+        return ""
+    return render_context(st.session_state.get("sim_context"), st.session_state.get("family_context"))
+
+if st.session_state.get("sim_context") or st.session_state.get("family_context"):
+    st.toggle("帶入我在「傳承路徑模擬」與「家族樹」填寫的資料", value=True, key="use_visitor_context")
+    if st.session_state.use_visitor_context:
+        with st.expander("顧問 AI 會看到的資料", expanded=False):
+            st.text(visitor_context())
 
 # ====== 顯示歷史訊息 ======
 for role, content in st.session_state.chat:
@@ -42,27 +66,74 @@ for role, content in st.session_state.chat:
 
 # ====== 輔助：組裝 messages 並裁切歷史 ======
 def build_messages():
+    # 依 token 預算帶入最近的完整對話，更早的輪次以摘要形式附在系統提示之後
+    history, stats = build_history(
+        st.session_state.chat, st.session_state.chat_history,
+        budget=HISTORY_TOKENS, memory_budget=MEMORY_TOKENS,
+    )
+    st.session_state.chat_history_stats = stats
     messages = [{"role": "system", "content": SYS_PROMPT}]
-    # 只帶入最近 N 輪對話（每輪包含 user+assistant 兩則）
-    recent = st.session_state.chat[-(HISTORY_TURNS * 2):] if HISTORY_TURNS > 0 else st.session_state.chat
-    for r, c in recent:
-        messages.append({"role": r, "content": c})
-    return messages
+    context = visitor_context()
+    if context:
+        messages.append({"role": "system", "content": context})
+    return messages + history
+
+# ====== 指數退避重試（限流 429 + 暫時性錯誤） ======
+# 共用 client 關閉了 SDK 內建重試（max_retries=0），所以這裡要涵蓋 SDK 原本會重試的情況：
+# 連線失敗 / 逾時、408、409、5xx；其餘錯誤（金鑰無效、參數錯誤等）重試也沒用，直接拋出
+def _is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (RateLimitError, APIConnectionError, InternalServerError)):  # APITimeoutError 屬於 APIConnectionError
+        return True
+    return isinstance(e, APIStatusError) and e.status_code in (408, 409)
 
-# ====== 指數退避重試（針對 RateLimitError） ======
 @retry(
     reraise=True,
     stop=stop_after_attempt(5),                   # 最多重試 5 次
     wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type(RateLimitError),
+    retry=retry_if_exception(_is_retryable),
 )
-def call_openai(client: OpenAI, messages):
-    return client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=messages,
-        temperature=0.2,
-        max_tokens=MAX_TOKENS,
-    )
+def call_openai(client, messages, stream: bool = False):
+    # 串流模式下限流錯誤在建立連線時就會拋出（尚未輸出任何字），所以重試只包住 create
+    # 每次嘗試（含重試）都先向全域限流排隊；預扣 prompt 估計 + MAX_TOKENS，回覆後再依實際用量 settle
+    limiter = get_rate_limiter()
+    reservation = limiter.acquire(estimate_tokens(messages) + MAX_TOKENS, timeout=RATE_WAIT_SECONDS)
+    record("copilot.rate_wait", reservation.waited_ms)
+    extra = {"stream_options": {"include_usage": True}} if stream else {}
+    try:
+        resp = client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=MAX_TOKENS,
+            stream=stream,
+            **extra,
+        )
+    except Exception as e:
+        limiter.settle(reservation, 0)  # 沒有成功送出：token 額度退回
+        if isinstance(e, RateLimitError):
+            limiter.pause(_retry_after(e))
+        raise
+    return resp, reservation
+
+def _retry_after(e: RateLimitError) -> float:
+    try:
+        return float(e.response.headers.get("retry-after", 2))
+    except Exception:
+        return 2.0
+
+# ====== 串流：逐段產出文字，並記錄首字時間（TTFT） ======
+def iter_stream(stream, timing: dict):
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            timing["tokens"] = usage.total_tokens
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if "ttft_ms" not in timing:
+                timing["ttft_ms"] = round((time.perf_counter() - timing["t0"]) * 1000, 1)
+            yield delta
 
 # ====== 冷卻倒數（送出前提示） ======
 now = time.time()
@@ -74,6 +145,32 @@ st.caption("提示：輸入完成後請按 Enter 送出，送出後請稍候片
 # ====== 使用者輸入 ======
 user_msg = st.chat_input("想問的情境或問題，例如：先贈與還是用保單？有海外資產要注意什麼？")
 if user_msg:
+    # 問答快取：只用在對話的第一題且未帶入個人資料時（答案取決於前文或訪客數字，不能共用）
+    answer_cache = get_answer_cache()
+    has_context = bool(visitor_context())
+    standalone = not st.session_state.chat and not has_context
+    cached, cache_tier = (None, "skip")
+    if standalone:
+        t0 = time.perf_counter()
+        cached, cache_tier = answer_cache.get(user_msg, system_prompt=SYS_PROMPT, model=MODEL_NAME)
+        record("copilot.cache_lookup", (time.perf_counter() - t0) * 1000)
+
+    if cached is not None:
+        # 命中快取不呼叫 API，也就不受冷卻時間限制
+        st.session_state.chat.append(("user", user_msg))
+        with st.chat_message("user"):
+            st.markdown(user_msg)
+        with st.chat_message("assistant"):
+            st.markdown(cached)
+            if APP_ENV == "dev":
+                st.caption(f"快取命中（{cache_tier}）")
+        st.session_state.chat.append(("assistant", cached))
+        log_event("chat", payload={
+            "q": user_msg, "a": cached, "model": MODEL_NAME,
+            "cache": cache_tier, "cache_hit_rate": answer_cache.stats()["hit_rate"],
+        })
+        st.stop()
+
     # 節流：避免短時間重複呼叫
     now = time.time()
     delta = now - st.session_state.last_call_ts
@@ -87,26 +184,47 @@ if user_msg:
     with st.chat_message("user"):
         st.markdown(user_msg)
 
-    # 準備 OpenAI Client（若你的帳戶需要 organization，請在 Secrets 設 openai.organization）
-    api_key = st.secrets["openai"]["api_key"]
-    org     = st.secrets["openai"].get("organization", None)
-    client_kwargs = {"api_key": api_key}
-    if org:
-        client_kwargs["organization"] = org
-    client = OpenAI(**client_kwargs)
+    # 行程共用的 client（若你的帳戶需要 organization，請在 Secrets 設 openai.organization）
+    client = get_chat_client()
 
     messages = build_messages()
 
     with st.chat_message("assistant"):
         try:
             st.session_state.last_call_ts = time.time()  # 記錄節流時間點
-            resp = call_openai(client, messages)
-            ans = resp.choices[0].message.content
-            st.markdown(ans)
-            st.session_state.chat.append(("assistant", ans))
-            log_event("chat", payload={"q": user_msg, "a": ans, "model": MODEL_NAME})
+            timing = {"t0": time.perf_counter()}
+            if STREAM_REPLY:
+                stream, reservation = call_openai(client, messages, stream=True)
+                ans = st.write_stream(iter_stream(stream, timing))
+            else:
+                resp, reservation = call_openai(client, messages)
+                ans = resp.choices[0].message.content
+                if getattr(resp, "usage", None) is not None:
+                    timing["tokens"] = resp.usage.total_tokens
+                st.markdown(ans)
+            get_rate_limiter().settle(reservation, timing.get("tokens", reservation.tokens))
+            total_ms = round((time.perf_counter() - timing["t0"]) * 1000, 1)
+            ttft_ms = timing.get("ttft_ms", total_ms)  # 非串流時首字即整段回覆
+            record("copilot.ttft", ttft_ms)
+            record("copilot.total", total_ms)
+            if APP_ENV == "dev":
+                h = st.session_state.chat_history_stats
+                st.caption(
+                    f"首字 {ttft_ms:.0f} ms／完整回覆 {total_ms:.0f} ms｜"
+                    f"歷史 {h['kept']} 則 {h['history_tokens']} tokens、摘要 {h['memory_tokens']} tokens"
+                )
 
-        except RateLimitError:
+            st.session_state.chat.append(("assistant", ans))
+            if standalone:
+                answer_cache.put(user_msg, ans, system_prompt=SYS_PROMPT, model=MODEL_NAME)
+            log_event("chat", payload={
+                "q": user_msg, "a": ans, "model": MODEL_NAME,
+                "stream": STREAM_REPLY, "ttft_ms": ttft_ms, "total_ms": total_ms,
+                "cache": cache_tier, "cache_hit_rate": answer_cache.stats()["hit_rate"],
+                "context": has_context,
+            })
+
+        except (RateLimitError, RateLimitTimeout):
             st.error("目前顧問 AI 較忙或達到速率上限，系統已自動重試。請稍後再問一次，或將問題整合後再送。")
         except Exception as e:
             st.error("⚠️ 無法取得回覆。請確認 `openai.api_key` 有效，且帳戶對 gpt-5-nano 具有使用權。")
@@ -116,3 +234,4 @@ if user_msg:
 # ====== 頁尾說明 ======
 st.divider()
 st.info("小提醒：此對話僅供教育與初步規劃參考，實際方案仍需顧問審視。")
+render_dev_panel()
@@ -0,0 +1,94 @@
+# src/cache/lru.py — 行程內共用的有界 LRU 快取（含命中統計）
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    maxsize: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["hit_rate"] = round(self.hit_rate, 4)
+        return d
+
+class LRUCache(Generic[V]):
+    """
+    執行緒安全的 LRU：Streamlit 每位訪客的 script 跑在不同執行緒，但同一行程共用模組層級物件，
+    因此放在模組層級即可跨 session 共用。超過 maxsize 時淘汰最久未用的項目。
+    """
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize <= 0:
+            raise ValueError("maxsize 必須大於 0")
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, *, record: bool = True) -> Optional[V]:
+        """record=False：同一次查詢的重複讀取，不再計入命中統計"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                if record:
+                    self._hits += 1
+                return self._data[key]
+            if record:
+                self._misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], V]) -> V:
+        """有就回傳快取值；沒有就計算後存入。計算在鎖外進行（純函數，同 key 併發時重算也得到相同結果）。"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._data),
+                maxsize=self.maxsize,
+            )
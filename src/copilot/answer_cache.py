@@ -0,0 +1,202 @@
+# src/copilot/answer_cache.py — Copilot 問答快取（正規化問題精確比對 + 選用的相似度比對）
+#
+# 訪客常問幾乎相同的問題（「先贈與還是用保單？」「先贈與還是保單」），每次都打一輪 API 又吃速率額度。
+#   - 精確層：key = sha256(MODEL_NAME + SYS_PROMPT + 正規化問題)，LRU + TTL
+#   - 相似度層（選用，預設關閉）：問題轉成本機向量（字元 1-2 gram 雜湊，不需外部模型），
+#     與同一 model / prompt 下的已快取問題比 cosine，超過門檻即視為同一題。
+#     字元向量分不出「5000萬 / 8000萬」「有 / 沒有」，所以數字與否定詞不同的問題一律不比對（guard_signature）
+# 系統提示或模型一改，key 前綴不同，舊答案自然不再命中。
+from __future__ import annotations
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.cache.lru import LRUCache
+
+EMBED_DIM = 512
+Embedder = Callable[[str], np.ndarray]
+
+# 標點、空白與常見語助詞不影響題意；但數字中間的小數點要留著（「1.5億」≠「15億」）
+_STRIP_RE = re.compile(r"(?:(?!(?<=\d)\.(?=\d))[\s\W_])+", re.UNICODE)
+_FILLERS = ("請問", "想問", "呢", "嗎", "啊", "呀")
+# 相似度層不可忽略的字：數字（含中文數字）與否定詞
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?|[零〇一二兩三四五六七八九十百千萬億]+")
+_NEGATIONS = "沒不無非未別勿莫"
+
+def normalize_question(q: str) -> str:
+    """全半形統一（NFKC）、英文轉小寫、去掉標點空白（小數點除外）與句首尾語助詞"""
+    s = unicodedata.normalize("NFKC", q or "").lower()
+    s = _STRIP_RE.sub("", s)
+    for f in _FILLERS:
+        if s.startswith(f):
+            s = s[len(f):]
+        if s.endswith(f):
+            s = s[: -len(f)]
+    return s
+
+def prompt_fingerprint(system_prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+def answer_cache_key(question: str, *, system_prompt: str, model: str) -> str:
+    ns = prompt_fingerprint(system_prompt, model)
+    return ns + ":" + hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+def guard_signature(question: str) -> str:
+    """數字依出現順序、否定詞依字排序；兩題簽章不同就不可能是同一題"""
+    s = normalize_question(question)
+    numbers = _NUMBER_RE.findall(s)
+    negations = sorted(ch for ch in s if ch in _NEGATIONS)
+    return ",".join(numbers) + "|" + "".join(negations)
+
+def ngram_embedder(text: str, dim: int = EMBED_DIM) -> np.ndarray:
+    """字元 unigram + bigram 雜湊到固定維度後取 L2 正規化；中文題目改幾個字仍有高相似度"""
+    s = normalize_question(text)
+    vec = np.zeros(dim, dtype=np.float32)
+    grams = list(s) + [s[i:i + 2] for i in range(len(s) - 1)]
+    for g in grams:
+        vec[zlib.crc32(g.encode("utf-8")) % dim] += 1.0
+    n = float(np.linalg.norm(vec))
+    return vec / n if n else vec
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    question: str
+    answer: str
+    created_at: float
+
+class AnswerCache:
+    """
+    行程共用（跨 session）。get 回傳 (答案或 None, 命中層級："exact" / "semantic" / "miss")。
+    相似度層的向量與精確層同容量、同淘汰順序；對應的答案已過期或被淘汰時向量一併移除。
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 512,
+        ttl: float = 24 * 3600,
+        embedder: Optional[Embedder] = None,
+        threshold: float = 0.92,
+    ):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.embedder = embedder
+        self._exact: LRUCache[CachedAnswer] = LRUCache(maxsize=maxsize)
+        self._vectors: "OrderedDict[str, Tuple[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"exact": 0, "semantic": 0, "miss": 0, "expired": 0}
+
+    def _fresh(self, key: str, *, record: bool = True) -> Optional[CachedAnswer]:
+        entry = self._exact.get(key, record=record)
+        if entry is not None and time.time() - entry.created_at > self.ttl:
+            self._exact.invalidate(key)
+            with self._lock:
+                self._vectors.pop(key, None)
+                self._counts["expired"] += 1
+            return None
+        return entry
+
+    def get(self, question: str, *, system_prompt: str, model: str) -> Tuple[Optional[str], str]:
+        key = answer_cache_key(question, system_prompt=system_prompt, model=model)
+        entry = self._fresh(key)
+        tier = "exact"
+        if entry is None and self.embedder is not None:
+            key = self._nearest(question, self._scope(question, key))
+            # 精確層那次查詢已計入 LRU 統計，這裡不重複計算
+            entry = self._fresh(key, record=False) if key else None
+            tier = "semantic"
+        with self._lock:
+            if entry is None:
+                self._counts["miss"] += 1
+                return None, "miss"
+            self._counts[tier] += 1
+        return entry.answer, tier
+
+    @staticmethod
+    def _scope(question: str, key: str) -> str:
+        """相似度比對範圍：同一 model / prompt 且數字、否定詞完全相同"""
+        return key.split(":", 1)[0] + "|" + guard_signature(question)
+
+    def _nearest(self, question: str, scope: str) -> Optional[str]:
+        with self._lock:
+            keys = [k for k, (sc, _) in self._vectors.items() if sc == scope]
+            if not keys:
+                return None
+            mat = np.stack([self._vectors[k][1] for k in keys])
+        sims = mat @ self.embedder(question)
+        best = int(np.argmax(sims))
+        return keys[best] if float(sims[best]) >= self.threshold else None
+
+    def put(self, question: str, answer: str, *, system_prompt: str, model: str) -> None:
+        if not answer:
+            return
+        key = answer_cache_key(question, system_prompt=system_prompt, model=model)
+        self._exact.put(key, CachedAnswer(question=question, answer=answer, created_at=time.time()))
+        if self.embedder is None:
+            return
+        vec = self.embedder(question)
+        with self._lock:
+            self._vectors[key] = (self._scope(question, key), vec)
+            self._vectors.move_to_end(key)
+            # 與精確層同步淘汰
+            for k in [k for k in self._vectors if k not in self._exact]:
+                del self._vectors[k]
+
+    def clear(self) -> None:
+        self._exact.clear()
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            vectors = len(self._vectors)
+        hits = counts["exact"] + counts["semantic"]
+        total = hits + counts["miss"]
+        lru = self._exact.stats()
+        return {
+            **counts,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "size": lru.size,
+            "maxsize": lru.maxsize,
+            "evictions": lru.evictions,
+            "vectors": vectors,
+            "semantic_enabled": self.embedder is not None,
+        }
+
+_CACHE: Optional[AnswerCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def get_answer_cache() -> AnswerCache:
+    """
+    secrets.toml 可調整：
+      [copilot_cache]
+      max_items = 512
+      ttl_hours = 24
+      semantic = false     # true 另開相似度比對（數字、否定詞不同的問題不會互相命中）
+      threshold = 0.92     # 相似度門檻（cosine）
+    """
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                try:
+                    import streamlit as st
+                    cfg = dict(st.secrets.get("copilot_cache", {}))
+                except Exception:  # 沒有 secrets.toml
+                    cfg = {}
+                _CACHE = AnswerCache(
+                    maxsize=int(cfg.get("max_items", 512)),
+                    ttl=float(cfg.get("ttl_hours", 24)) * 3600,
+                    embedder=ngram_embedder if cfg.get("semantic", False) else None,
+                    threshold=float(cfg.get("threshold", 0.92)),
+                )
+    return _CACHE
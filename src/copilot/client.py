@@ -0,0 +1,52 @@
+# src/copilot/client.py — 行程共用的聊天模型 client（OpenAI 或本機替身）
+#
+# 原本每則訊息都 new 一個 OpenAI()，每次都重新建立 TLS 連線；改為整個行程共用一個 client 與 httpx 連線池。
+# 重試交給頁面上的 tenacity + 全域限流（max_retries=0），避免 SDK 內建重試再乘上一層；
+# 頁面的重試條件涵蓋 SDK 原本會重試的錯誤（429、連線失敗 / 逾時、408、409、5xx）。
+#   .streamlit/secrets.toml：
+#   [openai]
+#   api_key = "..."
+#   organization = "..."    # 選填
+#   [copilot]
+#   client = "local"        # 選填：改用 src/copilot/local_client.py 的替身（也可設環境變數 LEGACY_COPILOT_CLIENT）
+from __future__ import annotations
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+import streamlit as st
+
+from src.copilot.local_client import LocalChatClient
+
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE = 10
+HTTP_TIMEOUT = 60.0
+
+def copilot_config() -> Dict[str, Any]:
+    try:
+        return dict(st.secrets.get("copilot", {}))
+    except Exception:  # 沒有 secrets.toml
+        return {}
+
+def client_mode() -> str:
+    return str(os.environ.get("LEGACY_COPILOT_CLIENT") or copilot_config().get("client", "openai")).lower()
+
+@st.cache_resource(show_spinner=False)
+def _openai_client(api_key: str, organization: Optional[str]):
+    from openai import OpenAI
+    http = httpx.Client(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+        timeout=HTTP_TIMEOUT,
+    )
+    return OpenAI(api_key=api_key, organization=organization, http_client=http, max_retries=0)
+
+@st.cache_resource(show_spinner=False)
+def _local_client() -> LocalChatClient:
+    return LocalChatClient()
+
+def get_chat_client():
+    """回傳共用 client（介面皆為 client.chat.completions.create）"""
+    if client_mode() == "local":
+        return _local_client()
+    cfg = st.secrets["openai"]
+    return _openai_client(cfg["api_key"], cfg.get("organization", None))
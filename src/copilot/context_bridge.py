@@ -0,0 +1,101 @@
+# src/copilot/context_bridge.py — 把試算頁 / 家族樹已填的資料帶進 Copilot 對話
+#
+# 系統提示要求模型先釐清家庭結構與資產；但訪客多半已在 02_Tax_Path_Simulator 或 Home 家族樹填過。
+# 各頁把最新結果存成精簡 dict 放進 session_state（同一個 session 跨頁共用）：
+#   - st.session_state.sim_context    = scenario_context(sim, res, heirs=...)
+#   - st.session_state.family_context = family_context(family, unions)
+# Copilot 頁以 render_context(...) 組成一段結構化文字，作為系統訊息附在 SYS_PROMPT 之後，省去來回詢問的輪次。
+from __future__ import annotations
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from src.tax.simulator import SimInputs, SimResult
+
+CONTEXT_HEADER = "【訪客已提供的資料（來自站內試算，單位：萬元；已知項目請直接引用，不要再詢問）】"
+MAX_FAMILY_MEMBERS = 30   # 家族樹人數上限（避免極端輸入撐大 prompt）
+
+def scenario_context(sim: SimInputs, res: SimResult, *, heirs: str = "") -> Dict[str, Any]:
+    """試算頁：輸入、扣除摘要與三情境比較"""
+    return {
+        "members": list(sim.members),
+        "has_spouse": sim.has_spouse,
+        "adult_children": sim.adult_children,
+        "parents": sim.parents,
+        "disabled_people": sim.disabled_people,
+        "other_dependents": sim.other_dependents,
+        "realty": sim.realty,
+        "equities": sim.equities,
+        "cash": sim.cash,
+        "overseas": sim.overseas,
+        "prefer": sim.prefer,
+        "heirs": heirs,
+        "taxable": res.taxable_10k,
+        "deduct": res.deduct_10k,
+        "base_tax": res.base_tax_show_10k,
+        "comparisons": {k: int(v["total_tax"]) for k, v in res.comparisons.items()},
+        "best": res.best_key,
+        "saved": res.saved_10k,
+        "pct": res.pct,
+        "gap": res.gap_10k,
+        "gap_note": res.gap_note,
+    }
+
+def family_context(family: Sequence[Mapping[str, Any]], unions: Sequence[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Home 家族樹：成員（關係、年齡、存歿、父母）與婚姻關係"""
+    people = [
+        {
+            "name": m.get("name", ""),
+            "relation": m.get("relation", ""),
+            "age": m.get("age"),
+            "alive": bool(m.get("alive", True)),
+            "father": m.get("father", "") or "",
+            "mother": m.get("mother", "") or "",
+        }
+        for m in list(family)[:MAX_FAMILY_MEMBERS]
+    ]
+    return {
+        "people": people,
+        "unions": [{"a": u.get("a", ""), "b": u.get("b", ""), "type": u.get("type", "")} for u in unions],
+        "truncated": max(0, len(family) - MAX_FAMILY_MEMBERS),
+    }
+
+def _sim_lines(c: Mapping[str, Any]) -> List[str]:
+    yes = lambda b: "有" if b else "無"
+    lines = [
+        f"家庭：配偶 {yes(c['has_spouse'])}｜成年子女 {c['adult_children']}｜父母 {c['parents']}｜"
+        f"身障 {c['disabled_people']}｜其他受扶養 {c['other_dependents']}"
+        + (f"｜成員 {'、'.join(c['members'])}" if c.get("members") else ""),
+        f"資產：不動產 {c['realty']}｜股票 {c['equities']}｜現金 {c['cash']}｜合計 {c['realty'] + c['equities'] + c['cash']}"
+        f"｜海外資產 {c['overseas']}｜偏好 {c['prefer']}",
+    ]
+    if c.get("heirs"):
+        lines.append(f"分配意向：{c['heirs']}")
+    lines.append(f"遺產稅（2025 級距）：課稅淨額 {c['taxable']}｜扣除合計 {c['deduct']}｜基準稅額 {c['base_tax']}")
+    lines.append("情境稅費合計：" + "；".join(f"{k} {v}" for k, v in c["comparisons"].items()))
+    lines.append(f"最佳情境：{c['best']}，可節省 {c['saved']}（{c['pct']}）｜現金稅源：{c['gap_note']}（缺口 {c['gap']}）")
+    return lines
+
+def _family_lines(c: Mapping[str, Any]) -> List[str]:
+    people = []
+    for p in c["people"]:
+        attrs = [p["relation"]] if p["relation"] else []
+        if p["age"] not in (None, ""):
+            attrs.append(f"{p['age']}歲")
+        if not p["alive"]:
+            attrs.append("歿")
+        parents = "/".join(x for x in (p["father"], p["mother"]) if x)
+        if parents:
+            attrs.append(f"父母 {parents}")
+        people.append(f"{p['name']}（{'，'.join(attrs)}）" if attrs else p["name"])
+    lines = ["家族樹：" + "；".join(people) + (f"；另有 {c['truncated']} 人未列" if c.get("truncated") else "")]
+    if c.get("unions"):
+        lines.append("婚姻：" + "；".join(f"{u['a']}－{u['b']}（{u['type']}）" for u in c["unions"]))
+    return lines
+
+def render_context(sim_ctx: Optional[Mapping[str, Any]], family_ctx: Optional[Mapping[str, Any]]) -> str:
+    """兩者皆無時回傳空字串（不附加任何訊息）"""
+    lines: List[str] = []
+    if sim_ctx:
+        lines += _sim_lines(sim_ctx)
+    if family_ctx and family_ctx.get("people"):
+        lines += _family_lines(family_ctx)
+    return CONTEXT_HEADER + "\n" + "\n".join(lines) if lines else ""
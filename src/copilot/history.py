@@ -0,0 +1,127 @@
+# src/copilot/history.py — 依 token 預算組裝對話歷史，較舊的輪次壓成滾動摘要
+#
+# 以則數裁切（最近 N 輪）時，幾則長回覆就能把 prompt 撐大、拖慢回應；短對話又浪費額度。
+#   - 由新到舊放入完整訊息，直到用完 budget（最新一則使用者訊息一定保留），切點對齊到「使用者訊息」開頭
+#   - 切點之前的輪次逐步併入摘要（每輪取問題與回答首句，不另外呼叫模型），摘要本身也有 token 上限
+#   - 每則訊息的 token 數以內容雜湊快取在 HistoryState（放在 session_state），長對話不會每次重算；
+#     快取有上限（LRU），已併入摘要的舊訊息不再被查詢、會自然被淘汰；摘要文字每次都不同，直接計數不快取
+# 有安裝 tiktoken 時用它計數，否則用 rate_limit.estimate_tokens 的粗估（中文 1 字約 1 token）。
+from __future__ import annotations
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from src.cache.lru import LRUCache
+from src.copilot.rate_limit import estimate_tokens
+
+MESSAGE_OVERHEAD = 4           # 每則訊息的角色/分隔符號
+SUMMARY_CHARS = 60             # 摘要中每個問題 / 回答最多保留幾個字
+MEMORY_HEADER = "先前對話重點（自動摘要，僅供延續脈絡）："
+TOKEN_CACHE_SIZE = 256         # 每位訪客快取幾則訊息的 token 數（遠大於 budget 內可放的則數）
+
+def _make_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(enc.encode(text, disallowed_special=())) + MESSAGE_OVERHEAD
+    except Exception:  # 未安裝 tiktoken 或無法下載編碼表
+        return lambda text: estimate_tokens([{"content": text}])
+
+count_text_tokens = _make_counter()
+
+@dataclass
+class HistoryState:
+    """存在 st.session_state 的每位訪客狀態"""
+    token_counts: LRUCache[int] = field(default_factory=lambda: LRUCache(maxsize=TOKEN_CACHE_SIZE))
+    memory: List[str] = field(default_factory=list)   # 已併入摘要的每一輪（由舊到新）
+    folded: int = 0                                   # chat 前 folded 則已併入摘要
+
+    def tokens(self, role: str, content: str) -> int:
+        key = hashlib.sha1(f"{role}\n{content}".encode("utf-8")).hexdigest()
+        n = self.token_counts.get(key)
+        if n is None:
+            n = count_text_tokens(content)
+            self.token_counts.put(key, n)
+        return n
+
+def _first_sentence(text: str) -> str:
+    for line in text.splitlines():
+        if line.lstrip().startswith("#"):  # Markdown 標題通常只是「建議」「重點」之類，跳過
+            continue
+        line = re.sub(r"^[\s>*\-\d\.\)）、]+", "", line.replace("**", "")).strip()
+        if line:
+            m = re.match(r"(.+?[。！？!?])", line)
+            s = m.group(1) if m else line
+            return s if len(s) <= SUMMARY_CHARS else s[:SUMMARY_CHARS] + "…"
+    return ""
+
+def summarize_turns(chat: Sequence[Tuple[str, str]]) -> List[str]:
+    """把 (role, content) 序列依「問 → 答」配對，各取一行重點"""
+    lines: List[str] = []
+    q = ""
+    for role, content in chat:
+        if role == "user":
+            if q:
+                lines.append(f"- 問：{q}")
+            q = _first_sentence(content)
+        else:
+            a = _first_sentence(content)
+            lines.append(f"- 問：{q}／答：{a}" if q else f"- 答：{a}")
+            q = ""
+    if q:
+        lines.append(f"- 問：{q}")
+    return lines
+
+def _memory_message(state: HistoryState, budget: int) -> str:
+    """摘要超過 budget 時從最舊的輪次開始捨棄（摘要只會往後加，捨棄的輪次之後也放不進來，直接從 state 移除）"""
+    lines = state.memory
+    while lines:
+        text = MEMORY_HEADER + "\n" + "\n".join(lines)
+        if count_text_tokens(text) <= budget:
+            return text
+        lines.pop(0)
+    return ""
+
+def build_history(
+    chat: Sequence[Tuple[str, str]],
+    state: HistoryState,
+    *,
+    budget: int,
+    memory_budget: int,
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    回傳 (要送出的歷史訊息, 統計)。歷史訊息不含系統提示；有摘要時第一則為 system 摘要訊息。
+    統計：kept 則數、history_tokens、memory_tokens、folded 則數。
+    """
+    used = 0
+    cut = len(chat)
+    for i in range(len(chat) - 1, -1, -1):
+        n = state.tokens(*chat[i])
+        if used + n > budget and cut < len(chat):
+            break
+        used += n
+        cut = i
+    # 不從回答中間開始：切點往後移到下一則使用者訊息
+    while 0 < cut < len(chat) - 1 and chat[cut][0] != "user":
+        used -= state.tokens(*chat[cut])
+        cut += 1
+
+    if cut > state.folded:
+        state.memory.extend(summarize_turns(chat[state.folded:cut]))
+        state.folded = cut
+
+    messages: List[Dict[str, str]] = []
+    memory_tokens = 0
+    if state.memory:
+        memory = _memory_message(state, memory_budget)
+        if memory:
+            memory_tokens = count_text_tokens(memory)
+            messages.append({"role": "system", "content": memory})
+    messages.extend({"role": r, "content": c} for r, c in chat[cut:])
+    return messages, {
+        "kept": len(chat) - cut,
+        "history_tokens": used,
+        "memory_tokens": memory_tokens,
+        "folded": state.folded,
+    }
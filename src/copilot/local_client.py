@@ -0,0 +1,56 @@
+# src/copilot/local_client.py — 本機替身：介面同 OpenAI client.chat.completions.create（測試 / 離線用）
+#
+# secrets.toml 設 [copilot] client = "local"（或環境變數 LEGACY_COPILOT_CLIENT=local）時由 src/copilot/client.py 改用此替身；
+# 回覆內容固定由問題組成，可設定延遲模擬首字時間，calls 計數可用來確認快取是否擋下呼叫。
+from __future__ import annotations
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+class _Completions:
+    def __init__(self, owner: "LocalChatClient"):
+        self._owner = owner
+
+    def create(self, *, model: str, messages: List[Dict[str, Any]], stream: bool = False, **_: Any):
+        return self._owner._respond(model, messages, stream)
+
+class LocalChatClient:
+    def __init__(self, *, first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def reply_for(self, messages: List[Dict[str, Any]]) -> str:
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return (
+            f"（本機測試回覆）關於「{question}」：\n"
+            "1) 先確認家庭結構與資產配置\n"
+            "2) 評估贈與、保單與信託的搭配\n"
+            "3) 歡迎下載顧問報告或預約諮詢。"
+        )
+
+    def _respond(self, model: str, messages: List[Dict[str, Any]], stream: bool):
+        with self._lock:
+            self.calls += 1
+        text = self.reply_for(messages)
+        # 用量以字數粗估（讓呼叫端的限流 settle 有數字可用）
+        usage = SimpleNamespace(total_tokens=sum(len(str(m.get("content") or "")) for m in messages) + len(text))
+        if not stream:
+            time.sleep(self.first_token_delay)
+            return SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=text))],
+                usage=usage,
+            )
+        return self._stream(text, usage)
+
+    def _stream(self, text: str, usage: SimpleNamespace) -> Iterator[SimpleNamespace]:
+        time.sleep(self.first_token_delay)
+        for i in range(0, len(text), 4):
+            if i:
+                time.sleep(self.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + 4]))])
+        yield SimpleNamespace(choices=[], usage=usage)  # 同 include_usage 的最後一塊：沒有 choices、只有用量
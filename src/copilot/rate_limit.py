@@ -0,0 +1,145 @@
+# src/copilot/rate_limit.py — 全行程共用的 token bucket 限流（每分鐘請求數 + 每分鐘 token 數）
+#
+# 每個 session 各自的 COOLDOWN_SECONDS 擋不住「很多人同時問」：大家一起撞上供應商上限，再一起在 tenacity 裡重試。
+# 這裡所有 session 共用兩個 bucket，呼叫前先 acquire（排隊依先來後到，不會有人一直搶不到），
+# 回覆後依實際用量 settle 多退少補；收到 429 時 pause 讓全部呼叫一起暫停，而不是各自重試。
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Mapping, Optional
+
+class RateLimitTimeout(RuntimeError):
+    """排隊超過 timeout 仍拿不到額度"""
+
+class TokenBucket:
+    """容量 capacity、每秒補 rate；level 可被 settle 扣成負數（實際用量超過預估時）"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        if per_minute <= 0:
+            raise ValueError("per_minute 必須大於 0")
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """還要等幾秒才有 amount（超過容量的請求以容量計，否則永遠等不到）"""
+        need = min(amount, self.capacity) - self.level
+        return max(0.0, need / self.rate)
+
+@dataclass(frozen=True)
+class Reservation:
+    tokens: int
+    waited_ms: float
+
+class RateLimiter:
+    def __init__(self, *, rpm: float, tpm: float):
+        self._cond = threading.Condition()
+        self._queue: Deque[object] = deque()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._paused_until = 0.0
+        self._granted = 0
+        self._timeouts = 0
+        self._pauses = 0
+        self._waited_ms = 0.0
+
+    def acquire(self, tokens: int, *, timeout: Optional[float] = None) -> Reservation:
+        """阻塞到輪到自己且兩個 bucket 都有額度；只有排在最前面的呼叫會扣額度（FIFO 公平）"""
+        ticket = object()
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + timeout
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait: Optional[float] = None
+                    if self._queue[0] is ticket:
+                        self._requests.refill(now)
+                        self._tokens.refill(now)
+                        wait = max(self._paused_until - now, self._requests.wait_time(1), self._tokens.wait_time(tokens))
+                        if wait <= 0:
+                            self._requests.level -= 1
+                            self._tokens.level -= tokens
+                            waited = (now - t0) * 1000
+                            self._granted += 1
+                            self._waited_ms += waited
+                            return Reservation(tokens=tokens, waited_ms=round(waited, 1))
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise RateLimitTimeout(f"排隊超過 {timeout:g} 秒仍無可用額度")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def settle(self, reservation: Reservation, used_tokens: int) -> None:
+        """以實際用量修正預扣的 token（預估多了退回、少了補扣）"""
+        with self._cond:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + reservation.tokens - used_tokens)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """供應商回 429：所有排隊中的呼叫一起暫停 seconds 秒"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._pauses += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            return {
+                "queued": len(self._queue),
+                "granted": self._granted,
+                "timeouts": self._timeouts,
+                "pauses": self._pauses,
+                "avg_wait_ms": round(self._waited_ms / self._granted, 1) if self._granted else 0.0,
+                "requests_left": round(self._requests.level, 2),
+                "tokens_left": round(self._tokens.level),
+                "paused_s": round(max(0.0, self._paused_until - now), 1),
+            }
+
+def estimate_tokens(messages: Iterable[Mapping[str, Any]]) -> int:
+    """粗估 prompt token：中日韓字約 1 字 1 token、英數約 4 字元 1 token，每則訊息另加 4"""
+    total = 0
+    for m in messages:
+        text = str(m.get("content") or "")
+        wide = sum(1 for ch in text if ord(ch) > 0x2E7F)
+        total += wide + (len(text) - wide + 3) // 4 + 4
+    return total
+
+_LIMITER: Optional[RateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    secrets.toml 可調整（依帳戶的供應商額度設定）：
+      [copilot]
+      rpm = 60        # 每分鐘請求數
+      tpm = 60000     # 每分鐘 token 數（prompt + 回覆）
+    """
+    global _LIMITER
+    if _LIMITER is None:
+        with _LIMITER_LOCK:
+            if _LIMITER is None:
+                try:
+                    import streamlit as st
+                    cfg = dict(st.secrets.get("copilot", {}))
+                except Exception:  # 沒有 secrets.toml
+                    cfg = {}
+                _LIMITER = RateLimiter(rpm=float(cfg.get("rpm", 60)), tpm=float(cfg.get("tpm", 60000)))
+    return _LIMITER
@@ -0,0 +1,160 @@
+# src/report/bulk.py — 批次重產 PDF 報告（行程池）
+#
+# 用法（請在 repo 根目錄執行，字型與 logo 以相對路徑讀取）：
+#   python -m src.report.bulk --jsonl leads.jsonl --out reports/
+#   python -m src.report.bulk --from-db --since-id 1000 --out reports.zip --workers 8
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 子行程內的品牌設定（由 initializer 設定一次）
+_WORKER_BRAND: Dict[str, Any] = {}
+
+def _init_worker(brand: Dict[str, Any]) -> None:
+    """每個子行程啟動時執行一次：載入 report_builder（同時註冊字型）並記下品牌設定。"""
+    global _WORKER_BRAND
+    _WORKER_BRAND = brand
+    import src.report.report_builder  # noqa: F401  import 時即完成 _register_fonts()
+
+def _render_one(record: Dict[str, Any]) -> Tuple[Any, Optional[bytes], float, Optional[str]]:
+    """回傳 (lead id, pdf bytes, 產生秒數, 錯誤訊息)；單筆失敗不影響整批。"""
+    from src.report.report_builder import build_pdf
+
+    lead_id = record.get("id")
+    t0 = time.perf_counter()
+    try:
+        payload = record.get("payload_json") or {}
+        pdf = build_pdf(
+            inputs_summary=payload.get("inputs") or {},
+            result_summary=payload.get("result") or {},
+            comparisons=payload.get("comparisons"),
+            recommendations=payload.get("recommendations") or {},
+            brand=_WORKER_BRAND,
+            template=True,  # 每個子行程只在第一份報告建立一次樣板
+        )
+        return lead_id, pdf, time.perf_counter() - t0, None
+    except Exception as e:
+        return lead_id, None, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+# ========= 資料來源 =========
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """每行一筆：{"id": ..., "payload_json": {...}}；若整行就是 payload（含 inputs/result）也可。"""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if "payload_json" not in rec:
+                rec = {"id": rec.get("id", n), "payload_json": rec}
+            yield rec
+
+def iter_db(*, since_id: int = 0, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """從 leads 表依 id 遞增分頁讀取（id > since_id）。"""
+    from src.repos.leads_repo import iter_leads
+
+    return iter_leads(since_id=since_id, page_size=page_size, columns=("id",), include_payload=True)
+
+# ========= 輸出 =========
+class _Sink:
+    """輸出到資料夾（每筆一個檔）或 zip（邊產生邊寫入，不在記憶體累積）"""
+
+    def __init__(self, out: str):
+        self.out = out
+        self.zip: Optional[zipfile.ZipFile] = None
+        if out.lower().endswith(".zip"):
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            self.zip = zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED)  # PDF 本身已壓縮
+        else:
+            os.makedirs(out, exist_ok=True)
+
+    def write(self, lead_id: Any, pdf: bytes) -> None:
+        name = f"lead_{lead_id}.pdf"
+        if self.zip is not None:
+            self.zip.writestr(name, pdf)
+        else:
+            with open(os.path.join(self.out, name), "wb") as f:
+                f.write(pdf)
+
+    def close(self) -> None:
+        if self.zip is not None:
+            self.zip.close()
+
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+def run_bulk(
+    records: Iterator[Dict[str, Any]],
+    out: str,
+    *,
+    workers: Optional[int] = None,
+    brand: Optional[Dict[str, Any]] = None,
+    chunksize: int = 4,
+) -> Dict[str, Any]:
+    """以行程池產生 PDF 並串流寫出；回傳吞吐量與單份延遲統計。"""
+    sink = _Sink(out)
+    latencies: List[float] = []
+    errors: List[Tuple[Any, str]] = []
+    total_bytes = 0
+    t0 = time.perf_counter()
+    try:
+        with Pool(processes=workers or os.cpu_count(), initializer=_init_worker, initargs=(brand or {},)) as pool:
+            for lead_id, pdf, secs, err in pool.imap_unordered(_render_one, records, chunksize=chunksize):
+                latencies.append(secs)
+                if err or pdf is None:
+                    errors.append((lead_id, err or "empty output"))
+                    continue
+                sink.write(lead_id, pdf)
+                total_bytes += len(pdf)
+    finally:
+        sink.close()
+    wall = time.perf_counter() - t0
+
+    latencies.sort()
+    done = len(latencies) - len(errors)
+    return {
+        "reports": done,
+        "errors": len(errors),
+        "error_samples": errors[:10],
+        "wall_seconds": round(wall, 3),
+        "reports_per_second": round(done / wall, 2) if wall > 0 else 0.0,
+        "latency_ms_p50": round(_percentile(latencies, 50) * 1000, 1),
+        "latency_ms_p95": round(_percentile(latencies, 95) * 1000, 1),
+        "latency_ms_max": round((latencies[-1] if latencies else 0.0) * 1000, 1),
+        "total_bytes": total_bytes,
+    }
+
+def _load_brand() -> Dict[str, Any]:
+    """沿用 Streamlit secrets（.streamlit/secrets.toml）中的 brand 設定；讀不到就用預設。"""
+    try:
+        import streamlit as st
+        return dict(st.secrets.get("brand", {}))
+    except Exception:
+        return {}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="批次重產顧問報告 PDF")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--jsonl", help="JSONL 檔，每行一筆 lead（含 payload_json）")
+    src.add_argument("--from-db", action="store_true", help="直接讀取 Supabase leads 表")
+    ap.add_argument("--since-id", type=int, default=0, help="--from-db 時只處理 id 大於此值的 lead")
+    ap.add_argument("--out", required=True, help="輸出資料夾，或以 .zip 結尾的壓縮檔")
+    ap.add_argument("--workers", type=int, default=None, help="子行程數（預設為 CPU 核心數）")
+    args = ap.parse_args(argv)
+
+    records = iter_jsonl(args.jsonl) if args.jsonl else iter_db(since_id=args.since_id)
+    stats = run_bulk(records, args.out, workers=args.workers, brand=_load_brand())
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 1 if stats["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+# src/report/pdf_cache.py — 以報告內容雜湊為 key 的 PDF 快取（記憶體 LRU + 磁碟）
+#
+# 同樣的輸入（Demo 頁的固定資料、同一份模擬重複送出）直接回傳已產生的 PDF bytes。
+#   - key = sha256(版本 + 日期 + 品牌設定 + 精簡模式 + inputs/result/comparisons/recommendations)
+#     報告上印有產生日期，所以 key 含日期：隔天自然重新產生
+#   - 記憶體層：LRU（跨 session 共用）；磁碟層：超過容量上限時刪除最久未使用的檔案
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.cache.lru import LRUCache
+from src.report.report_builder import PdfReport, _brand_config, build_pdf_with_stats
+from src.telemetry.tracing import span
+
+# 報告版面或內容格式改變時調高，舊快取即自動失效
+REPORT_FORMAT_VERSION = 1
+
+def report_cache_key(
+    *,
+    inputs_summary: Dict[str, Any],
+    result_summary: Dict[str, Any],
+    recommendations: Dict[str, Any],
+    comparisons: Optional[Dict[str, Any]],
+    brand: Dict[str, Any],
+    compact: bool,
+    day: Optional[date] = None,
+) -> str:
+    doc = {
+        "v": REPORT_FORMAT_VERSION,
+        "day": (day or date.today()).isoformat(),
+        "brand": brand,
+        "compact": bool(compact),
+        "inputs": inputs_summary,
+        "result": result_summary,
+        "comparisons": comparisons,
+        "recommendations": recommendations,
+    }
+    # dict 保留插入順序且會影響表格列順序，所以不排序鍵
+    blob = json.dumps(doc, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """
+    以檔案存放 bytes：<dir>/<key 前兩碼>/<key>.pdf；寫入用暫存檔 + os.replace，多行程同時寫也不會讀到半個檔。
+    讀取時更新 mtime，容量超過上限時依 mtime 淘汰（刪到上限的 90%）。
+    """
+
+    SUFFIX = ".pdf"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + self.SUFFIX)
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        out = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(self.SUFFIX):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    out.append((st.st_mtime, path, st.st_size))
+        return out
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # 標記為最近使用
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            existed = os.path.exists(path)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            if not existed:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """呼叫端需持有 self._lock；重新掃描實際大小（其他行程也可能寫入同一目錄）"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, path, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                total -= size
+        self._size = total
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+class PdfCache:
+    """兩層快取；get_or_build 回傳 (pdf bytes, 命中層級："memory" / "disk" / "miss")"""
+
+    def __init__(self, *, memory_items: int = 128, disk_dir: Optional[str] = None, disk_max_bytes: int = 200 * 1024 * 1024):
+        self.memory: LRUCache[bytes] = LRUCache(maxsize=memory_items)
+        self.disk: Optional[DiskCache] = DiskCache(disk_dir, disk_max_bytes) if disk_dir else None
+        self._disk_hits = 0
+
+    def get(self, key: str) -> Tuple[Optional[bytes], str]:
+        data = self.memory.get(key)
+        if data is not None:
+            return data, "memory"
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self._disk_hits += 1
+                self.memory.put(key, data)
+                return data, "disk"
+        return None, "miss"
+
+    def put(self, key: str, data: bytes) -> None:
+        self.memory.put(key, data)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, data)
+            except OSError:
+                pass  # 磁碟滿或唯讀：只用記憶體層
+
+    def get_or_build(self, key: str, build: Callable[[], bytes]) -> Tuple[bytes, str]:
+        data, tier = self.get(key)
+        if data is None:
+            data = build()
+            self.put(key, data)
+        return data, tier
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"memory": self.memory.stats().as_dict(), "disk_hits": self._disk_hits}
+        if self.disk is not None:
+            out["disk_bytes"] = self.disk.size_bytes
+            out["disk_max_bytes"] = self.disk.max_bytes
+            out["disk_evictions"] = self.disk.evictions
+        return out
+
+# ========= 報告產生入口（Streamlit 行程共用一個快取） =========
+DEFAULT_DISK_DIR = os.path.join(".cache", "pdf")
+
+_CACHE: Optional[PdfCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def _cache_config() -> Dict[str, Any]:
+    try:
+        import streamlit as st
+        return dict(st.secrets.get("pdf_cache", {}))
+    except Exception:  # 沒有 secrets.toml
+        return {}
+
+def get_pdf_cache() -> PdfCache:
+    """
+    secrets.toml 可調整：
+      [pdf_cache]
+      memory_items = 128
+      disk_dir = ".cache/pdf"   # 設為 "" 只用記憶體層
+      disk_max_mb = 200
+    """
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                cfg = _cache_config()
+                _CACHE = PdfCache(
+                    memory_items=int(cfg.get("memory_items", 128)),
+                    disk_dir=cfg.get("disk_dir", DEFAULT_DISK_DIR) or None,
+                    disk_max_bytes=int(float(cfg.get("disk_max_mb", 200)) * 1024 * 1024),
+                )
+    return _CACHE
+
+def build_pdf_cached(
+    *,
+    inputs_summary: Dict[str, Any],
+    result_summary: Dict[str, Any],
+    recommendations: Dict[str, Any],
+    comparisons: Optional[Dict[str, Any]] = None,
+    brand: Optional[Dict[str, Any]] = None,
+    compact: bool = False,
+    template: bool = True,
+) -> Tuple[PdfReport, str]:
+    """
+    同 build_pdf_with_stats，但相同內容直接回傳快取的 bytes。
+    回傳 (PdfReport, 命中層級)；命中時 render_ms 為查快取所花的時間。
+    """
+    brand = dict(_brand_config(brand))
+    key = report_cache_key(
+        inputs_summary=inputs_summary, result_summary=result_summary,
+        recommendations=recommendations, comparisons=comparisons,
+        brand=brand, compact=compact,
+    )
+    t0 = time.perf_counter()
+    cache = get_pdf_cache()
+    with span("pdf.cache_lookup"):
+        data, tier = cache.get(key)
+    if data is not None:
+        return PdfReport(data=data, render_ms=round((time.perf_counter() - t0) * 1000, 1), compact=compact), tier
+
+    report = build_pdf_with_stats(
+        inputs_summary=inputs_summary, result_summary=result_summary,
+        recommendations=recommendations, comparisons=comparisons,
+        brand=brand, compact=compact, template=template,
+    )
+    cache.put(key, report.data)
+    return report, "miss"
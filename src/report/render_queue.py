@@ -0,0 +1,121 @@
+# src/report/render_queue.py — 背景產生 PDF 的工作佇列（執行緒池 + 工作表）
+#
+# 頁面送出後只登記一個工作就返回（先顯示 lead id），PDF 在背景執行緒產生；
+# 頁面以 st.fragment 定時查詢工作狀態，完成後才顯示下載按鈕。
+# 某一份報告特別慢時只佔住一個 worker，不會卡住其他訪客的 Streamlit 腳本執行緒。
+from __future__ import annotations
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from src.report.pdf_cache import build_pdf_cached
+from src.report.report_builder import PdfReport
+from src.telemetry.tracing import record, span
+
+QUEUED, RUNNING, DONE, ERROR = "queued", "running", "done", "error"
+
+@dataclass
+class RenderJob:
+    job_id: str
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    report: Optional[PdfReport] = None
+    cache_tier: str = ""
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, ERROR)
+
+    @property
+    def queue_ms(self) -> float:
+        """排隊等待 worker 的時間"""
+        if self.started_at is None:
+            return round((time.time() - self.submitted_at) * 1000, 1)
+        return round((self.started_at - self.submitted_at) * 1000, 1)
+
+class RenderQueue:
+    """
+    行程共用的 PDF 產生佇列。工作表只保留最近的工作：完成超過 ttl 秒或超過 max_jobs 筆時，
+    最舊的已完成工作會被移除（bytes 一併釋放；之後同內容再要一次會從 PDF 快取取得）。
+    """
+
+    def __init__(self, *, workers: int = 2, max_jobs: int = 512, ttl: float = 15 * 60):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-render")
+        self._jobs: Dict[str, RenderJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, *, on_done: Optional[Callable[[RenderJob], None]] = None, **build_kwargs: Any) -> str:
+        """登記一個產生工作並立即回傳 job_id；build_kwargs 同 build_pdf_cached"""
+        job = RenderJob(job_id=uuid.uuid4().hex)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self._pool.submit(self._run, job, build_kwargs, on_done)
+        return job.job_id
+
+    def _run(self, job: RenderJob, build_kwargs: Dict[str, Any], on_done) -> None:
+        job.started_at = time.time()
+        job.status = RUNNING
+        record("pdf.queue_wait", job.queue_ms)
+        try:
+            with span("pdf.render_job"):
+                job.report, job.cache_tier = build_pdf_cached(**build_kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = ERROR
+        finally:
+            job.finished_at = time.time()
+        if on_done is not None:
+            try:
+                on_done(job)
+            except Exception:
+                pass  # 事件紀錄等後續動作失敗不影響報告本身
+
+    def get(self, job_id: str) -> Optional[RenderJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        """呼叫端需持有 self._lock"""
+        now = time.time()
+        expired = [k for k, j in self._jobs.items() if j.finished and now - (j.finished_at or now) > self.ttl]
+        for k in expired:
+            del self._jobs[k]
+        if len(self._jobs) >= self.max_jobs:
+            done = sorted((j.finished_at or 0, k) for k, j in self._jobs.items() if j.finished)
+            for _, k in done[: len(self._jobs) - self.max_jobs + 1]:
+                del self._jobs[k]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, ERROR: 0}
+            for j in self._jobs.values():
+                counts[j.status] += 1
+            return {"workers": self.workers, "jobs": len(self._jobs), **counts}
+
+_QUEUE: Optional[RenderQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+def get_render_queue() -> RenderQueue:
+    """secrets.toml 可設定 [render_queue] workers = 2"""
+    global _QUEUE
+    if _QUEUE is None:
+        with _QUEUE_LOCK:
+            if _QUEUE is None:
+                try:
+                    import streamlit as st
+                    cfg = dict(st.secrets.get("render_queue", {}))
+                except Exception:  # 沒有 secrets.toml
+                    cfg = {}
+                _QUEUE = RenderQueue(workers=int(cfg.get("workers", 2)))
+    return _QUEUE
@@ -1,90 +1,251 @@
 from __future__ import annotations
 from io import BytesIO
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+import copy
+import json
 import os
 import re
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
 import streamlit as st
 
+from src.cache.lru import LRUCache
+
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
+from reportlab.lib.utils import ImageReader, simpleSplit
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
+    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable
 )
-from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+try:  # 樣板模式用到的 ReportLab 內部函式；新版若移除，樣板模式會自動退回一般排版
+    from reportlab.pdfgen.canvas import _digester
+except ImportError:
+    _digester = None
 from reportlab.pdfbase.ttfonts import TTFont
+from PIL import Image as PILImage
+
+from src.telemetry.tracing import record, span
 
 # ========= 1) 繁中字型（請將 TTF 放在 assets/fonts/ 下） =========
 FONT_DIR = os.path.join("assets", "fonts")
 REGULAR_TTF = os.path.join(FONT_DIR, "NotoSansTC-Regular.ttf")
 BOLD_TTF    = os.path.join(FONT_DIR, "NotoSansTC-Bold.ttf")
 
+# 已解析的 TTF 字型物件（行程內只讀檔、解析一次）
+_FONT_OBJECTS: Dict[str, TTFont] = {}
+
 def _register_fonts() -> Tuple[str, str]:
     try:
         if os.path.exists(REGULAR_TTF) and os.path.exists(BOLD_TTF):
-            pdfmetrics.registerFont(TTFont("NotoTC", REGULAR_TTF))
-            pdfmetrics.registerFont(TTFont("NotoTC-Bold", BOLD_TTF))
+            for name, path in (("NotoTC", REGULAR_TTF), ("NotoTC-Bold", BOLD_TTF)):
+                if name not in _FONT_OBJECTS:
+                    _FONT_OBJECTS[name] = TTFont(name, path)
+                    pdfmetrics.registerFont(_FONT_OBJECTS[name])
             return "NotoTC", "NotoTC-Bold"
     except Exception:
         pass
     return "Helvetica", "Helvetica-Bold"
 
-BASE_FONT, BASE_FONT_BOLD = _register_fonts()
+with span("pdf.register_fonts"):
+    BASE_FONT, BASE_FONT_BOLD = _register_fonts()
 
 # ========= 2) Logo：本地優先 → secrets.logo_url → 佔位圖 =========
-def _try_logo(story) -> bool:
-    """回傳是否成功放置了 logo，用來決定是否顯示品牌大標"""
-    # ① 本地 logo.png
-    local = os.path.join("assets", "logo.png")
-    if os.path.exists(local):
-        try:
-            story.append(RLImage(local, width=180, height=180 * 0.28))
-            story.append(Spacer(1, 10))  # 與後續文字留白
-            return True
-        except Exception:
-            pass
+LOGO_LOCAL       = os.path.join("assets", "logo.png")
+LOGO_PLACEHOLDER = os.path.join("assets", "logo_placeholder.png")
+LOGO_WIDTH, LOGO_HEIGHT = 180, 180 * 0.28
+LOGO_COMPACT_MAX_PX = 360  # 精簡模式：logo 最長邊縮到約 2 倍顯示尺寸（~144 dpi）
+LOGO_RETRY_SECONDS = 60    # logo_url 下載失敗後多久再試
+
+def _brand_config(brand: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """品牌設定：呼叫端有傳就用傳入的（批次/子行程不依賴 Streamlit），否則讀 secrets.brand"""
+    if brand is not None:
+        return brand
+    return st.secrets.get("brand", {})
+
+class _AssetCache:
+    """
+    行程共用的報告素材：logo 只讀檔/下載與解碼一次（ImageReader 會保留解碼後的像素），
+    之後每份報告直接引用。換 logo 或品牌設定後請呼叫 invalidate_asset_cache()。
+    logo_url 下載失敗（改用佔位圖或沒有 logo）只記住 LOGO_RETRY_SECONDS 秒，之後的報告會再試一次，
+    不會因為一次網路錯誤就整個行程都沒有 logo。
+    """
 
-    # ② secrets logo_url
-    brand = st.secrets.get("brand", {})
-    logo_url = brand.get("logo_url", "")
-    if logo_url:
-        try:
-            story.append(RLImage(logo_url, width=180, height=180 * 0.28))
-            story.append(Spacer(1, 10))
-            return True
-        except Exception:
-            pass
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key: logo_url（"" 表示未設定）→ (結果, 到期時間；None 表示不過期)
+        self._logos: Dict[str, Tuple[Optional[Tuple[bytes, ImageReader]], Optional[float]]] = {}
+        # key: logo_url → (縮圖來源的 logo, 縮圖)；來源換了（重試成功）就重做
+        self._compact: Dict[str, Tuple[Optional[Tuple[bytes, ImageReader]], Optional[ImageReader]]] = {}
 
-    # ③ 佔位圖
-    placeholder = os.path.join("assets", "logo_placeholder.png")
-    if os.path.exists(placeholder):
+    @staticmethod
+    def _load(source: str) -> Optional[Tuple[bytes, ImageReader]]:
         try:
-            story.append(RLImage(placeholder, width=180, height=180 * 0.28))
-            story.append(Spacer(1, 10))
-            return True
+            if source.startswith(("http://", "https://")):
+                with urllib.request.urlopen(source, timeout=5) as resp:
+                    data = resp.read()
+            elif os.path.exists(source):
+                with open(source, "rb") as f:
+                    data = f.read()
+            else:
+                return None
+            reader = ImageReader(BytesIO(data))
+            reader.getRGBData()  # 先解碼，確認是可用的圖檔
+            return data, reader
         except Exception:
-            pass
-    return False
-
-# ========= 3) 小工具 =========
-def _kv_table(data: Dict[str, Any], col1: str = "欄位", col2: str = "內容"):
-    rows = [[col1, col2]] + [[str(k), str(v)] for k, v in data.items()]
-    t = Table(rows, colWidths=[140, 360])
-    t.setStyle(TableStyle([
-        ("FONTNAME", (0, 0), (-1, -1), BASE_FONT),
+            return None
+
+    def logo(self, logo_url: str) -> Optional[Tuple[bytes, ImageReader]]:
+        with self._lock:
+            entry = self._logos.get(logo_url)
+            if entry is not None and (entry[1] is None or time.monotonic() < entry[1]):
+                return entry[0]
+        # 依序：① 本地 logo.png ② secrets logo_url ③ 佔位圖；找不到也記住結果，避免每份報告重試
+        found = None
+        expires: Optional[float] = None
+        for source in (LOGO_LOCAL, logo_url, LOGO_PLACEHOLDER):
+            if source:
+                found = self._load(source)
+                if found:
+                    break
+                if source == logo_url and source.startswith(("http://", "https://")):
+                    expires = time.monotonic() + LOGO_RETRY_SECONDS  # 可能只是暫時連不上
+        with self._lock:
+            self._logos[logo_url] = (found, expires)
+        return found
+
+    def compact_logo(self, logo_url: str) -> Optional[ImageReader]:
+        """縮小解析度後的 logo（精簡模式用）；同樣只處理一次。"""
+        logo = self.logo(logo_url)
+        with self._lock:
+            entry = self._compact.get(logo_url)
+            if entry is not None and entry[0] is logo:
+                return entry[1]
+        reader = None
+        if logo is not None:
+            try:
+                im = PILImage.open(BytesIO(logo[0]))
+                im.thumbnail((LOGO_COMPACT_MAX_PX, LOGO_COMPACT_MAX_PX), PILImage.LANCZOS)
+                reader = ImageReader(im)
+                reader.getRGBData()
+            except Exception:
+                reader = logo[1]
+        with self._lock:
+            self._compact[logo_url] = (logo, reader)
+        return reader
+
+    def reader(self, logo_url: str, compact: bool = False) -> Optional[ImageReader]:
+        """報告要用的 logo（精簡模式為縮圖）；None 表示沒有可用的 logo"""
+        if compact:
+            return self.compact_logo(logo_url)
+        logo = self.logo(logo_url)
+        return logo[1] if logo else None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._logos.clear()
+            self._compact.clear()
+
+_ASSETS = _AssetCache()
+
+def invalidate_asset_cache() -> None:
+    """清除已快取的 logo 與報告樣板（更換 assets/logo.png 或 brand.logo_url 後呼叫）"""
+    global _TEMPLATE_FAILED
+    _ASSETS.invalidate()
+    _TEMPLATES.clear()
+    _TEMPLATE_FAILED = None
+
+class _LogoFlowable(Flowable):
+    """直接以共用的 ImageReader 繪製 logo，不必每份報告重新讀檔、解碼。"""
+
+    def __init__(self, reader: ImageReader, width: float, height: float):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = "CENTER"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask="auto")
+
+def _try_logo(story, brand: Optional[Dict[str, Any]] = None, compact: bool = False) -> bool:
+    """回傳是否成功放置了 logo，用來決定是否顯示品牌大標"""
+    brand = _brand_config(brand)
+    reader = _ASSETS.reader(brand.get("logo_url", ""), compact)
+    if reader is None:
+        return False
+    story.append(_LogoFlowable(reader, LOGO_WIDTH, LOGO_HEIGHT))
+    story.append(Spacer(1, 10))  # 與後續文字留白
+    return True
+
+# ========= 2b) 共用樣式（每組字型只建一次，建好後唯讀） =========
+@dataclass(frozen=True)
+class _StyleSet:
+    paragraphs: Dict[str, ParagraphStyle]
+    kv_table: TableStyle
+    comparison_table: TableStyle
+
+def _build_styles(font: str, font_bold: str) -> _StyleSet:
+    styles = getSampleStyleSheet()
+    styles["Normal"].fontName = font
+    styles["Normal"].fontSize = 11
+    styles["Heading3"].fontName = font_bold
+    styles["Heading3"].fontSize = 13
+    paragraphs = {
+        "Normal": styles["Normal"],
+        "Heading3": styles["Heading3"],
+        "Title": ParagraphStyle(
+            "TitleTW", parent=styles["Normal"],
+            fontName=font_bold, fontSize=20, leading=24
+        ),
+        "Subtitle": ParagraphStyle(
+            "SubtitleTW", parent=styles["Normal"],
+            fontName=font, fontSize=12, leading=16
+        ),
+    }
+    kv_table = TableStyle([
+        ("FONTNAME", (0, 0), (-1, -1), font),
         ("FONTSIZE", (0, 0), (-1, -1), 10),
 
         ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#111827")),
         ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-        ("FONTNAME", (0,0), (-1,0), BASE_FONT_BOLD),
+        ("FONTNAME", (0,0), (-1,0), font_bold),
 
         ("ALIGN", (0,0), (-1,-1), "LEFT"),
         ("GRID", (0,0), (-1,-1), 0.5, colors.HexColor("#E5E7EB")),
         ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.white, colors.HexColor("#F9FAFB")]),
         ("BOTTOMPADDING", (0,0), (-1,0), 6),
         ("TOPPADDING", (0,0), (-1,0), 6),
-    ]))
+    ])
+    comparison_table = TableStyle([
+        ("FONTNAME", (0, 0), (-1, -1), font),
+        ("FONTSIZE", (0, 0), (-1, -1), 10),
+
+        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#0F766E")),
+        ("TEXTCOLOR", (0,0), (-1,0), colors.white),
+        ("FONTNAME", (0,0), (-1,0), font_bold),
+
+        ("GRID", (0,0), (-1,-1), 0.5, colors.HexColor("#D1FAE5")),
+        ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.white, colors.HexColor("#ECFEFF")]),
+    ])
+    return _StyleSet(paragraphs, kv_table, comparison_table)
+
+# 一般模式：內文/粗體兩套字型；精簡模式：標題也用內文字型，PDF 只需內嵌一套 CJK 字型子集
+STYLES         = _build_styles(BASE_FONT, BASE_FONT_BOLD)
+COMPACT_STYLES = _build_styles(BASE_FONT, BASE_FONT)
+
+# ========= 3) 小工具 =========
+def _kv_table(data: Dict[str, Any], col1: str = "欄位", col2: str = "內容", style: TableStyle | None = None):
+    rows = [[col1, col2]] + [[str(k), str(v)] for k, v in data.items()]
+    t = Table(rows, colWidths=[140, 360])
+    t.setStyle(style or STYLES.kv_table)
     return t
 
 def _sanitize_inputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
@@ -131,16 +292,108 @@ def _derive_kpi_from_comparisons(comparisons: Dict[str, Any]) -> Dict[str, Any]:
         "降幅": pct,
     }
 
+def _lead_sections(
+    style_set: _StyleSet,
+    inputs_summary: Dict[str, Any],
+    result_summary: Dict[str, Any],
+    recommendations: Dict[str, Any],
+    comparisons: Dict[str, Any] | None,
+) -> List[Tuple[str, Table, float]]:
+    """每位客戶不同的部分：[(章節標題, 表格, 表格後留白)]"""
+    sections: List[Tuple[str, Table, float]] = []
+
+    # 一、基本情境（含「＋」→「、」的清理）
+    clean_inputs = _sanitize_inputs(inputs_summary)
+    sections.append(("一、您的基本情境", _kv_table(clean_inputs, style=style_set.kv_table), 12))
+
+    # 二、重點結果摘要（若有 comparisons，改為 KPI 精華，避免與表格重複）
+    if comparisons:
+        kpi = _derive_kpi_from_comparisons(comparisons)
+        # 將 KPI 與原本摘要合併（KPI 置頂）
+        merged = {**kpi, **result_summary}
+        sections.append(("二、重點結果摘要", _kv_table(merged, "項目", "數值／說明", style_set.kv_table), 12))
+    else:
+        sections.append(("二、重點結果摘要", _kv_table(result_summary, "項目", "數值／說明", style_set.kv_table), 12))
+
+    # 三、情境比較（基準 vs. 規劃）
+    if comparisons:
+        rows = [["情境", "稅費合計", "備註"]]
+        for name, info in comparisons.items():
+            rows.append([name, str(info.get("total_tax", "-")), info.get("note", "")])
+        t = Table(rows, colWidths=[160, 130, 210])
+        t.setStyle(style_set.comparison_table)
+        sections.append(("三、情境比較（基準 vs. 規劃）", t, 12))
+
+    # 四、顧問建議
+    sections.append(("四、顧問建議", _kv_table(recommendations, "重點", "說明", style_set.kv_table), 18))
+    return sections
+
 # ========= 4) 產生 PDF =========
 def build_pdf(
     *,
     inputs_summary: Dict[str, Any],
     result_summary: Dict[str, Any],
     recommendations: Dict[str, Any],
-    comparisons: Dict[str, Any] | None = None
+    comparisons: Dict[str, Any] | None = None,
+    brand: Optional[Dict[str, Any]] = None,
+    compact: bool = False,
+    template: bool = False
 ) -> bytes:
-
-    brand = st.secrets.get("brand", {})
+    """
+    產生顧問報告 PDF。compact=True 時：logo 降解析度、全文只用一套字型（少內嵌一份 CJK 字型子集），
+    縮小寄送用的檔案（頁面串流壓縮為 ReportLab 預設，兩種模式皆有）。TTF 字型本來就只內嵌用到的字元（ReportLab 自動子集化）。
+    template=True 時改用樣板模式（見 ReportTemplate）：固定版面只排一次，每份報告只排表格。
+    """
+    return build_pdf_with_stats(
+        inputs_summary=inputs_summary,
+        result_summary=result_summary,
+        recommendations=recommendations,
+        comparisons=comparisons,
+        brand=brand,
+        compact=compact,
+        template=template,
+    ).data
+
+@dataclass(frozen=True)
+class PdfReport:
+    data: bytes
+    render_ms: float
+    compact: bool
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+def build_pdf_with_stats(
+    *,
+    inputs_summary: Dict[str, Any],
+    result_summary: Dict[str, Any],
+    recommendations: Dict[str, Any],
+    comparisons: Dict[str, Any] | None = None,
+    brand: Optional[Dict[str, Any]] = None,
+    compact: bool = False,
+    template: bool = False
+) -> PdfReport:
+    """同 build_pdf，另回傳產生耗時與模式（供 download_pdf 事件記錄）"""
+    global _TEMPLATE_FAILED
+    if template and _TEMPLATE_FAILED is None:
+        try:
+            return get_report_template(brand, compact=compact).render(
+                inputs_summary=inputs_summary,
+                result_summary=result_summary,
+                recommendations=recommendations,
+                comparisons=comparisons,
+            )
+        except TemplateUnsupported as e:
+            # 樣板模式依賴 ReportLab 內部 API（見 _PreparedImage）；不相容時改用一般排版，
+            # 並在本行程內停用樣板模式（invalidate_asset_cache() 會重設），避免每份報告都先失敗一次
+            _TEMPLATE_FAILED = str(e)
+            record("pdf.template_fallback", 0.0, error=True)
+        except Exception:
+            # 其他錯誤（例如這份報告的內容）只影響這一次：改用一般排版，樣板模式維持開啟
+            record("pdf.template_fallback", 0.0, error=True)
+    t0 = time.perf_counter()
+    brand = _brand_config(brand)
     brand_title = brand.get("title", "Grace Family Office｜永傳家族辦公室")
     footer = brand.get("footer", "")
     show_title_below_logo = bool(brand.get("show_title_below_logo", False))  # 有 logo 時預設不顯示大標
@@ -148,27 +401,17 @@ def build_pdf(
     buffer = BytesIO()
     doc = SimpleDocTemplate(
         buffer, pagesize=A4,
-        leftMargin=36, rightMargin=36, topMargin=40, bottomMargin=40
+        leftMargin=36, rightMargin=36, topMargin=40, bottomMargin=40,
     )
-    styles = getSampleStyleSheet()
-    styles["Normal"].fontName = BASE_FONT
-    styles["Normal"].fontSize = 11
-    styles["Heading3"].fontName = BASE_FONT_BOLD
-    styles["Heading3"].fontSize = 13
-
+    style_set = COMPACT_STYLES if compact else STYLES
+    styles = style_set.paragraphs
     story = []
 
     # Header：Logo（若有則預設不再顯示大品牌名，避免重複）
-    has_logo = _try_logo(story)
+    has_logo = _try_logo(story, brand, compact=compact)
 
-    title_style = ParagraphStyle(
-        "TitleTW", parent=styles["Normal"],
-        fontName=BASE_FONT_BOLD, fontSize=20, leading=24
-    )
-    subtitle_style = ParagraphStyle(
-        "SubtitleTW", parent=styles["Normal"],
-        fontName=BASE_FONT, fontSize=12, leading=16
-    )
+    title_style = styles["Title"]
+    subtitle_style = styles["Subtitle"]
 
     if (not has_logo) or show_title_below_logo:
         story.append(Paragraph(brand_title, title_style))
@@ -176,51 +419,213 @@ def build_pdf(
     story.append(Paragraph(f"顧問建議報告｜{datetime.now().strftime('%Y-%m-%d')}", subtitle_style))
     story.append(Spacer(1, 12))
 
-    # 一、基本情境（含「＋」→「、」的清理）
-    clean_inputs = _sanitize_inputs(inputs_summary)
-    story.append(Paragraph("一、您的基本情境", styles["Heading3"]))
-    story.append(_kv_table(clean_inputs))
-    story.append(Spacer(1, 12))
-
-    # 二、重點結果摘要（若有 comparisons，改為 KPI 精華，避免與表格重複）
-    story.append(Paragraph("二、重點結果摘要", styles["Heading3"]))
-    if comparisons:
-        kpi = _derive_kpi_from_comparisons(comparisons)
-        # 將 KPI 與原本摘要合併（KPI 置頂）
-        merged = {**kpi, **result_summary}
-        story.append(_kv_table(merged, "項目", "數值／說明"))
-    else:
-        story.append(_kv_table(result_summary, "項目", "數值／說明"))
-    story.append(Spacer(1, 12))
-
-    # 三、情境比較（基準 vs. 規劃）
-    if comparisons:
-        story.append(Paragraph("三、情境比較（基準 vs. 規劃）", styles["Heading3"]))
-        rows = [["情境", "稅費合計", "備註"]]
-        for name, info in comparisons.items():
-            rows.append([name, str(info.get("total_tax", "-")), info.get("note", "")])
-        t = Table(rows, colWidths=[160, 130, 210])
-        t.setStyle(TableStyle([
-            ("FONTNAME", (0, 0), (-1, -1), BASE_FONT),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
+    for heading, table, space_after in _lead_sections(
+        style_set, inputs_summary, result_summary, recommendations, comparisons
+    ):
+        story.append(Paragraph(heading, styles["Heading3"]))
+        story.append(table)
+        story.append(Spacer(1, space_after))
 
-            ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#0F766E")),
-            ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-            ("FONTNAME", (0,0), (-1,0), BASE_FONT_BOLD),
+    if footer:
+        story.append(Paragraph(footer.replace("\n", "<br/>"), styles["Normal"]))
 
-            ("GRID", (0,0), (-1,-1), 0.5, colors.HexColor("#D1FAE5")),
-            ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.white, colors.HexColor("#ECFEFF")]),
-        ]))
-        story.append(t)
-        story.append(Spacer(1, 12))
+    with span("pdf.doc_build"):
+        doc.build(story)
+    return PdfReport(
+        data=buffer.getvalue(),
+        render_ms=round((time.perf_counter() - t0) * 1000, 1),
+        compact=compact,
+    )
 
-    # 四、顧問建議
-    story.append(Paragraph("四、顧問建議", styles["Heading3"]))
-    story.append(_kv_table(recommendations, "重點", "說明"))
-    story.append(Spacer(1, 18))
+# ========= 5) 樣板模式：固定版面每個品牌只排一次 =========
+# 表頭（logo / 品牌大標 / 副標）、章節標題、頁尾說明與表格樣式，同一品牌的每份報告都一樣：
+# 事先量好尺寸、斷好行，產生報告時直接畫到畫布上（不再經過 Paragraph 排版），
+# 每份報告只需要排四張客戶資料表。
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_X, MARGIN_TOP, MARGIN_BOTTOM = 36, 40, 40
+FRAME_PADDING = 6  # SimpleDocTemplate 預設 Frame 內距，表頭位置需對齊一般模式
+
+class _StaticLines(Flowable):
+    """已斷好行的固定文字（章節標題、頁尾說明），直接 drawString"""
+
+    def __init__(self, lines: Tuple[str, ...], font: str, size: float, leading: float,
+                 space_before: float = 0, space_after: float = 0):
+        super().__init__()
+        self.lines = lines
+        self.font, self.size, self.leading = font, size, leading
+        self.spaceBefore, self.spaceAfter = space_before, space_after
+        self.height = leading * len(lines)
+
+    def wrap(self, availWidth, availHeight):
+        return availWidth, self.height
+
+    def draw(self):
+        self.canv.setFont(self.font, self.size)
+        y = self.height - self.size
+        for line in self.lines:
+            self.canv.drawString(0, y, line)
+            y -= self.leading
+
+class TemplateUnsupported(RuntimeError):
+    """此版 ReportLab 的內部 API 與樣板模式不相容（與個別報告內容無關）"""
+
+class _PreparedImage:
+    """
+    預先編碼好的 PDF 影像物件（壓縮 + ASCII85 只做一次）。
+    產生報告時先把它登記到該份文件，canvas.drawImage 看到同名物件已存在就直接引用，不再重新編碼。
+    """
 
-    if footer:
-        story.append(Paragraph(footer.replace("\n", "<br/>"), styles["Normal"]))
+    def __init__(self, reader: ImageReader):
+        if _digester is None:
+            raise TemplateUnsupported("此版 ReportLab 不支援樣板模式（找不到 canvas._digester）")
+        self.reader = reader
+        try:
+            # 名稱算法與 Canvas.drawImage(mask="auto") 相同，才能被它找到
+            alpha = reader._dataA
+            mdata = alpha.getRGBData() if alpha else b"auto"
+            self.name = _digester(reader.getRGBData() + mdata)
+            self.xobject = pdfdoc.PDFImageXObject(self.name, reader, mask="auto")
+            self.xobject.name = self.name
+        except (AttributeError, TypeError) as e:
+            raise TemplateUnsupported(f"ReportLab 內部 API 不相容：{type(e).__name__}: {e}") from e
+
+    def register(self, canv) -> None:
+        try:
+            self._register(canv)
+        except (AttributeError, TypeError) as e:
+            raise TemplateUnsupported(f"ReportLab 內部 API 不相容：{type(e).__name__}: {e}") from e
+
+    def _register(self, canv) -> None:
+        doc = canv._doc
+        reg_name = doc.getXObjectName(self.name)
+        if doc.idToObject.get(reg_name) is not None:
+            return
+        # 文件登記時會在物件上寫入內部名稱，所以每份文件用淺拷貝（共用已編碼的 streamContent）
+        img = copy.copy(self.xobject)
+        smask = img.__dict__.pop("_smask", None)
+        canv._setXObjects(img)
+        doc.Reference(img, reg_name)
+        doc.addForm(self.name, img)
+        if smask is not None:
+            m_reg_name = doc.getXObjectName(smask.name)
+            if doc.idToObject.get(m_reg_name) is None:
+                smask = copy.copy(smask)
+                canv._setXObjects(smask)
+                img.smask = doc.Reference(smask, m_reg_name)
+            else:
+                img.smask = pdfdoc.PDFObjectReference(m_reg_name)
+
+class ReportTemplate:
+    """
+    某一品牌設定（+ 精簡模式與否）的報告樣板；建立後唯讀，可跨 session / 執行緒共用。
+    請用 get_report_template() 取得（已快取），不要自行建構。
+    """
 
-    doc.build(story)
-    return buffer.getvalue()
+    def __init__(self, brand: Dict[str, Any], compact: bool = False):
+        self.compact = compact
+        self.style_set = COMPACT_STYLES if compact else STYLES
+        paragraphs = self.style_set.paragraphs
+        self._title = paragraphs["Title"]
+        self._subtitle = paragraphs["Subtitle"]
+        self._heading = paragraphs["Heading3"]
+        self._normal = paragraphs["Normal"]
+
+        self.logo_url = brand.get("logo_url", "")
+        self.logo_reader = _ASSETS.reader(self.logo_url, compact)
+        self.logo = _PreparedImage(self.logo_reader) if self.logo_reader is not None else None
+
+        frame_width = PAGE_WIDTH - 2 * (MARGIN_X + FRAME_PADDING)
+        title = brand.get("title", "Grace Family Office｜永傳家族辦公室")
+        show_title = self.logo is None or bool(brand.get("show_title_below_logo", False))
+        self.title_lines: Tuple[str, ...] = tuple(
+            simpleSplit(title, self._title.fontName, self._title.fontSize, frame_width)
+        ) if show_title else ()
+
+        # 表頭高度：logo + 留白 10 → 大標 + 留白 4 → 副標 → 留白 12（與一般模式相同）
+        self.header_height = (
+            (LOGO_HEIGHT + 10 if self.logo is not None else 0)
+            + (self._title.leading * len(self.title_lines) + 4 if self.title_lines else 0)
+            + self._subtitle.leading + 12
+        )
+
+        footer = brand.get("footer", "")
+        self.footer_lines: Tuple[str, ...] = tuple(
+            line
+            for para in footer.split("\n")
+            for line in (simpleSplit(para, self._normal.fontName, self._normal.fontSize, frame_width) or [""])
+        ) if footer else ()
+
+    def _heading_flowable(self, text: str) -> _StaticLines:
+        h = self._heading
+        return _StaticLines((text,), h.fontName, h.fontSize, h.leading, h.spaceBefore, h.spaceAfter)
+
+    def _draw_header(self, canv, subtitle: str) -> None:
+        canv.saveState()
+        x, y = MARGIN_X + FRAME_PADDING, PAGE_HEIGHT - MARGIN_TOP - FRAME_PADDING
+        if self.logo is not None:
+            y -= LOGO_HEIGHT
+            self.logo.register(canv)
+            canv.drawImage(self.logo.reader, (PAGE_WIDTH - LOGO_WIDTH) / 2, y, LOGO_WIDTH, LOGO_HEIGHT, mask="auto")
+            y -= 10
+        if self.title_lines:
+            canv.setFont(self._title.fontName, self._title.fontSize)
+            for line in self.title_lines:
+                canv.drawString(x, y - self._title.fontSize, line)
+                y -= self._title.leading
+            y -= 4
+        canv.setFont(self._subtitle.fontName, self._subtitle.fontSize)
+        canv.drawString(x, y - self._subtitle.fontSize, subtitle)
+        canv.restoreState()
+
+    def render(
+        self,
+        *,
+        inputs_summary: Dict[str, Any],
+        result_summary: Dict[str, Any],
+        recommendations: Dict[str, Any],
+        comparisons: Dict[str, Any] | None = None,
+    ) -> PdfReport:
+        t0 = time.perf_counter()
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(
+            buffer, pagesize=A4,
+            leftMargin=MARGIN_X, rightMargin=MARGIN_X, topMargin=MARGIN_TOP, bottomMargin=MARGIN_BOTTOM,
+        )
+        subtitle = f"顧問建議報告｜{datetime.now().strftime('%Y-%m-%d')}"
+
+        story: List[Flowable] = [Spacer(1, self.header_height)]
+        for heading, table, space_after in _lead_sections(
+            self.style_set, inputs_summary, result_summary, recommendations, comparisons
+        ):
+            story.append(self._heading_flowable(heading))
+            story.append(table)
+            story.append(Spacer(1, space_after))
+        if self.footer_lines:
+            n = self._normal
+            story.append(_StaticLines(self.footer_lines, n.fontName, n.fontSize, n.leading))
+
+        with span("pdf.doc_build"):
+            doc.build(story, onFirstPage=lambda canv, _doc: self._draw_header(canv, subtitle))
+        return PdfReport(
+            data=buffer.getvalue(),
+            render_ms=round((time.perf_counter() - t0) * 1000, 1),
+            compact=self.compact,
+        )
+
+_TEMPLATES: LRUCache[ReportTemplate] = LRUCache(maxsize=32)
+# 樣板模式因 ReportLab 不相容而停用的原因（None 表示可用）；停用後 build_pdf_with_stats 一律走一般排版
+_TEMPLATE_FAILED: Optional[str] = None
+
+def template_mode_status() -> Optional[str]:
+    return _TEMPLATE_FAILED
+
+def get_report_template(brand: Optional[Dict[str, Any]] = None, *, compact: bool = False) -> ReportTemplate:
+    """依品牌設定內容（與精簡模式）取得快取的樣板；品牌設定變更時自然產生新樣板。"""
+    brand = dict(_brand_config(brand))
+    key = (json.dumps(brand, sort_keys=True, ensure_ascii=False, default=str), compact)
+    template = _TEMPLATES.get_or_compute(key, lambda: ReportTemplate(brand, compact=compact))
+    if template.logo_reader is not _ASSETS.reader(template.logo_url, compact):
+        # 建樣板時 logo 下載失敗、之後重試成功（或反之）：用目前的 logo 重建
+        template = ReportTemplate(brand, compact=compact)
+        _TEMPLATES.put(key, template)
+    return template
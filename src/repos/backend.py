@@ -0,0 +1,43 @@
+# src/repos/backend.py — 儲存後端選擇：Supabase（預設）或本機 SQLite 替身
+#
+# .streamlit/secrets.toml：
+#   [storage]
+#   backend = "sqlite"              # 預設 "supabase"
+#   sqlite_path = "data/legacy.db"
+# 沒有 secrets 檔時（離線壓測、CLI）也可用環境變數 LEGACY_STORAGE=sqlite、LEGACY_SQLITE_PATH=...
+from __future__ import annotations
+import os
+from typing import Any, Dict
+
+import streamlit as st
+
+DEFAULT_SQLITE_PATH = os.path.join("data", "legacy.db")
+
+def _storage_config() -> Dict[str, Any]:
+    try:
+        return dict(st.secrets.get("storage", {}))
+    except Exception:  # 沒有 secrets.toml
+        return {}
+
+def storage_backend() -> str:
+    backend = os.environ.get("LEGACY_STORAGE") or _storage_config().get("backend", "supabase")
+    backend = str(backend).lower()
+    if backend not in ("supabase", "sqlite"):
+        raise ValueError(f"未知的儲存後端：{backend}（可用 supabase / sqlite）")
+    return backend
+
+def use_sqlite() -> bool:
+    return storage_backend() == "sqlite"
+
+@st.cache_resource(show_spinner=False)
+def _sqlite_client(path: str):
+    from src.repos.sqlite_backend import SQLiteClient
+    return SQLiteClient(path)
+
+def get_db():
+    """repo 層統一入口：回傳 Supabase client，或查詢介面相同的 SQLite 替身"""
+    if use_sqlite():
+        path = os.environ.get("LEGACY_SQLITE_PATH") or _storage_config().get("sqlite_path", DEFAULT_SQLITE_PATH)
+        return _sqlite_client(path)
+    from src.supabase_client import get_supabase
+    return get_supabase()
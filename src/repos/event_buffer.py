@@ -0,0 +1,162 @@
+# src/repos/event_buffer.py — 事件緩衝：log_event 只入列，背景執行緒批次寫入 events 表
+from __future__ import annotations
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+Row = Dict[str, Any]
+
+class EventBuffer:
+    """
+    行程內的事件緩衝區：
+      - add() 只把事件放進佇列（不等資料庫），背景執行緒累積到 max_batch 筆或每 flush_interval 秒寫一次
+      - 寫入失敗以指數退避重試，重試用盡就丟棄該批並計數（事件紀錄不應影響使用者操作）
+      - 佇列上限 max_pending，滿了丟最舊的事件，避免資料庫長時間無法連線時記憶體無限增長
+      - 行程結束時（atexit）盡量把剩下的事件寫完
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List[Row]], None],
+        *,
+        max_batch: int = 50,
+        flush_interval: float = 2.0,
+        max_pending: int = 10_000,
+        max_attempts: int = 5,
+        max_backoff: float = 8.0,
+    ):
+        if max_batch <= 0 or max_pending <= 0:
+            raise ValueError("max_batch 與 max_pending 必須大於 0")
+        self._sink = sink
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._pending: Deque[Row] = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._inflight = 0          # 已取出、正在寫入的筆數（flush 需等它們完成）
+        self._closed = False
+        self._flush_requests = 0   # >0 時背景執行緒不等湊滿一批，立即寫出
+        self._thread: Optional[threading.Thread] = None
+        self._written = self._dropped = self._failed = self._batches = 0
+
+    # ---------- 入列 ----------
+    def add(self, row: Row) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EventBuffer 已關閉")
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1  # deque(maxlen) 會自動擠掉最舊的一筆
+            self._pending.append(row)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-buffer", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    # ---------- 背景寫入 ----------
+    def _take_batch(self) -> List[Row]:
+        """呼叫端需持有 self._cond"""
+        n = min(self.max_batch, len(self._pending))
+        batch = [self._pending.popleft() for _ in range(n)]
+        self._inflight += n
+        return batch
+
+    def _write(self, batch: List[Row]) -> None:
+        ok = False
+        try:
+            for attempt in Retrying(
+                stop=stop_after_attempt(self.max_attempts),
+                wait=wait_exponential(multiplier=0.5, max=self.max_backoff),
+                reraise=True,
+            ):
+                with attempt:
+                    self._sink(batch)
+            ok = True
+        except Exception:
+            pass
+        with self._cond:
+            self._inflight -= len(batch)
+            self._batches += 1
+            if ok:
+                self._written += len(batch)
+            else:
+                self._failed += len(batch)
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                # flush 請求只在有事件時才跳過等待；佇列空的時候一律等到 timeout，不空轉
+                while not self._closed and (
+                    not self._pending or (len(self._pending) < self.max_batch and not self._flush_requests)
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._pending:
+                    if self._closed:
+                        return
+                    continue
+                batch = self._take_batch()
+            self._write(batch)
+
+    # ---------- 控制 ----------
+    def flush(self, timeout: float = 10.0) -> bool:
+        """請背景執行緒立刻寫出目前所有事件，並等待完成；逾時回傳 False。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._thread is None:
+                return not self._pending
+            self._flush_requests += 1
+            try:
+                self._cond.notify_all()
+                while self._pending or self._inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._flush_requests -= 1
+
+    def close(self, timeout: float = 10.0) -> None:
+        """停止接收新事件，寫完剩下的（atexit 時呼叫）。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "inflight": self._inflight,
+                "written": self._written,
+                "batches": self._batches,
+                "failed": self._failed,
+                "dropped": self._dropped,
+            }
+
+_BUFFERS: List[EventBuffer] = []
+
+def register_for_shutdown(buffer: EventBuffer) -> EventBuffer:
+    """登記 atexit flush（同一行程可有多個 buffer）"""
+    _BUFFERS.append(buffer)
+    return buffer
+
+@atexit.register
+def _flush_all_on_exit() -> None:
+    for buffer in _BUFFERS:
+        try:
+            buffer.close(timeout=5.0)
+        except Exception:
+            pass
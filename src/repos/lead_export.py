@@ -0,0 +1,125 @@
+# src/repos/lead_export.py — leads 全表串流匯出（CRM 同步用）
+#
+# 用法（請在 repo 根目錄執行，Supabase 連線沿用 .streamlit/secrets.toml）：
+#   python -m src.repos.lead_export --out leads.csv
+#   python -m src.repos.lead_export --out leads.parquet --since-id 50000 --with-payload
+#   python -m src.repos.lead_export --out leads.jsonl --columns id,email,tag,created_at
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from src.repos.leads_repo import LEAD_COLUMNS, iter_leads
+
+FORMATS = ("csv", "jsonl", "parquet")
+PARQUET_ROW_GROUP = 10_000  # 每累積這麼多筆寫出一個 row group，記憶體上限約一個 row group
+
+def _format_from_path(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("ndjson", "json"):
+        return "jsonl"
+    if ext in FORMATS:
+        return ext
+    raise ValueError(f"無法由副檔名判斷格式：{path}（支援 {', '.join(FORMATS)}）")
+
+def _flat(value: Any) -> Any:
+    """CSV / Parquet 欄位需為純量：巢狀資料（payload_json）轉成 JSON 字串"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _write_csv(rows: Iterable[Dict[str, Any]], path: str, columns: List[str]) -> int:
+    n = 0
+    # utf-8-sig：Excel 開啟中文不亂碼
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: _flat(row.get(k)) for k in columns})
+            n += 1
+    return n
+
+def _write_jsonl(rows: Iterable[Dict[str, Any]], path: str, columns: List[str]) -> int:
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({k: row.get(k) for k in columns}, ensure_ascii=False))
+            f.write("\n")
+            n += 1
+    return n
+
+def _write_parquet(rows: Iterable[Dict[str, Any]], path: str, columns: List[str]) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("匯出 Parquet 需要 pyarrow：pip install pyarrow") from e
+
+    # id 為整數，其餘一律字串（created_at 保留 ISO 字串，payload_json 為 JSON 字串）
+    schema = pa.schema([(c, pa.int64() if c == "id" else pa.string()) for c in columns])
+    n = 0
+    buf: List[Dict[str, Any]] = []
+    with pq.ParquetWriter(path, schema) as writer:
+        for row in rows:
+            buf.append({k: (row.get(k) if k == "id" else _str_or_none(_flat(row.get(k)))) for k in columns})
+            if len(buf) >= PARQUET_ROW_GROUP:
+                writer.write_table(pa.Table.from_pylist(buf, schema=schema))
+                n += len(buf)
+                buf.clear()
+        if buf:
+            writer.write_table(pa.Table.from_pylist(buf, schema=schema))
+            n += len(buf)
+    return n
+
+def _str_or_none(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+_WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+def export_rows(rows: Iterable[Dict[str, Any]], path: str, columns: Sequence[str], fmt: Optional[str] = None) -> int:
+    """把任意逐筆產出的 rows 串流寫入檔案，回傳筆數"""
+    fmt = fmt or _format_from_path(path)
+    if fmt not in _WRITERS:
+        raise ValueError(f"不支援的格式：{fmt}（支援 {', '.join(FORMATS)}）")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return _WRITERS[fmt](rows, path, list(columns))
+
+def export_leads(
+    path: str,
+    *,
+    fmt: Optional[str] = None,
+    since_id: int = 0,
+    page_size: int = 1000,
+    columns: Sequence[str] = LEAD_COLUMNS,
+    include_payload: bool = False,
+) -> int:
+    """以 keyset 分頁讀取 leads 並直接寫出，記憶體只保留一頁（Parquet 為一個 row group）"""
+    cols = list(dict.fromkeys(["id", *columns]))
+    if include_payload and "payload_json" not in cols:
+        cols.append("payload_json")
+    rows = iter_leads(since_id=since_id, page_size=page_size, columns=cols, include_payload=include_payload)
+    return export_rows(rows, path, cols, fmt)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="匯出 leads 名單（CSV / JSONL / Parquet）")
+    ap.add_argument("--out", required=True, help="輸出檔案；格式由副檔名判斷（.csv / .jsonl / .parquet）")
+    ap.add_argument("--format", choices=FORMATS, default=None, help="強制指定格式")
+    ap.add_argument("--since-id", type=int, default=0, help="只匯出 id 大於此值的 lead（增量同步）")
+    ap.add_argument("--page-size", type=int, default=1000, help="每次向資料庫取的筆數（Supabase 每次最多回傳 API max-rows 筆，預設 1000；設得更大時實際以該上限分頁）")
+    ap.add_argument("--columns", default=",".join(LEAD_COLUMNS), help="以逗號分隔的欄位")
+    ap.add_argument("--with-payload", action="store_true", help="一併匯出 payload_json")
+    args = ap.parse_args(argv)
+
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()]
+    n = export_leads(
+        args.out, fmt=args.format, since_id=args.since_id, page_size=args.page_size,
+        columns=columns, include_payload=args.with_payload,
+    )
+    print(json.dumps({"out": args.out, "rows": n}, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,146 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional, List
-from src.supabase_client import get_supabase
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, List, Sequence, Tuple
+import streamlit as st
+from src.repos.backend import get_db
+from src.repos.event_buffer import EventBuffer, register_for_shutdown
+from src.telemetry.tracing import span, traced
 
-def save_lead(*, name: Optional[str], email: str, phone: Optional[str], case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> int:
-    sb = get_supabase()
-    data = {
+def lead_dedup_key(*, email: str, case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> str:
+    """
+    同一位訪客（email 不分大小寫、去空白）對同一案件/工具送出相同內容 → 同一個 key。
+    payload 以排序鍵的 JSON 雜湊，欄位順序不同也視為相同。
+    """
+    payload_hash = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    ).hexdigest()
+    parts = (email.strip().lower(), case_id or "", tag or "", payload_hash)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def build_lead_row(*, name, email, phone, case_id, tag, payload) -> Dict[str, Any]:
+    return {
         "name": name,
         "email": email,
         "phone": phone,
         "case_id": case_id,
         "tag": tag,
         "payload_json": payload,
+        "dedup_key": lead_dedup_key(email=email, case_id=case_id, tag=tag, payload=payload),
     }
-    res = sb.table("leads").insert(data).execute()
-    return int(res.data[0]["id"])  # type: ignore
+
+@traced("db.save_lead")
+def upsert_lead(*, name: Optional[str], email: str, phone: Optional[str], case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> Tuple[int, bool]:
+    """
+    冪等寫入：重複送出（rerun、連點）只做一次 dedup_key 查詢並回傳既有 lead id，不另存一份 payload。
+    兩個請求同時寫入時由唯一索引擋下，輸的一方再查一次取得 id。
+    回傳 (lead id, 是否為新建立)；呼叫端可據此避免重複記錄整份 payload。
+    """
+    sb = get_db()
+    data = build_lead_row(name=name, email=email, phone=phone, case_id=case_id, tag=tag, payload=payload)
+    key = data["dedup_key"]
+
+    res = sb.table("leads").select("id").eq("dedup_key", key).limit(1).execute()
+    if res.data:
+        return int(res.data[0]["id"]), False  # type: ignore
+    res = sb.table("leads").upsert(data, on_conflict="dedup_key", ignore_duplicates=True).execute()
+    if res.data:
+        return int(res.data[0]["id"]), True  # type: ignore
+    res = sb.table("leads").select("id").eq("dedup_key", key).limit(1).execute()
+    return int(res.data[0]["id"]), False  # type: ignore
+
+def save_lead(*, name: Optional[str], email: str, phone: Optional[str], case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> int:
+    """同 upsert_lead，只回傳 lead id"""
+    return upsert_lead(name=name, email=email, phone=phone, case_id=case_id, tag=tag, payload=payload)[0]
+
+LEAD_COLUMNS = ("id", "name", "email", "phone", "case_id", "tag", "created_at")
 
 def list_leads(limit: int = 100) -> List[Dict[str, Any]]:
-    sb = get_supabase()
-    res = sb.table("leads").select("id,name,email,phone,case_id,tag,created_at").order("id", desc=True).limit(limit).execute()
+    sb = get_db()
+    res = sb.table("leads").select(",".join(LEAD_COLUMNS)).order("id", desc=True).limit(limit).execute()
     return list(res.data or [])  # type: ignore
 
+def iter_leads(
+    *,
+    since_id: int = 0,
+    page_size: int = 1000,
+    columns: Sequence[str] = LEAD_COLUMNS,
+    include_payload: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    依 id 遞增逐筆產出 id > since_id 的 lead（keyset 分頁：每頁以上一頁最後的 id 為游標，
+    不用 offset，越後面的頁一樣快；記憶體只保留一頁）。
+    PostgREST 的 max-rows（Supabase 預設 1000）會把每頁截短到上限，所以只在拿到空頁時才結束，
+    page_size 設得比伺服器上限大也不會漏資料（只是每頁實際筆數較少）。
+    """
+    if page_size <= 0:
+        raise ValueError("page_size 必須大於 0")
+    cols = list(dict.fromkeys(["id", *columns]))  # 游標需要 id；保持欄位順序、去重
+    if include_payload and "payload_json" not in cols:
+        cols.append("payload_json")
+    select = ",".join(cols)
+
+    sb = get_db()
+    last_id = since_id
+    while True:
+        res = sb.table("leads").select(select).gt("id", last_id).order("id").limit(page_size).execute()
+        rows = list(res.data or [])  # type: ignore
+        if not rows:
+            return
+        yield from rows
+        last_id = int(rows[-1]["id"])
+
+# ========= 事件紀錄：預設先進緩衝區，由背景執行緒批次寫入 =========
+_EVENT_BUFFER: Optional[EventBuffer] = None
+_EVENT_BUFFER_LOCK = threading.Lock()
+
+def _event_buffer() -> Optional[EventBuffer]:
+    """secrets.events.buffered = false 時回傳 None（每個事件同步寫入，方便除錯）"""
+    global _EVENT_BUFFER
+    try:
+        cfg = st.secrets.get("events", {})
+    except Exception:  # 沒有 secrets.toml（離線 / SQLite 後端）
+        cfg = {}
+    if not cfg.get("buffered", True):
+        return None
+    if _EVENT_BUFFER is None:
+        with _EVENT_BUFFER_LOCK:
+            if _EVENT_BUFFER is None:
+                # client 在呼叫端（Streamlit 腳本執行緒）取得，背景執行緒只負責 insert
+                sb = get_db()
+                def insert_batch(rows: List[Dict[str, Any]]) -> None:
+                    with span("db.events_insert_batch"):
+                        sb.table("events").insert(rows).execute()
+
+                _EVENT_BUFFER = register_for_shutdown(EventBuffer(
+                    insert_batch,
+                    max_batch=int(cfg.get("max_batch", 50)),
+                    flush_interval=float(cfg.get("flush_interval", 2.0)),
+                    max_pending=int(cfg.get("max_pending", 10_000)),
+                ))
+    return _EVENT_BUFFER
+
+@traced("db.log_event")
 def log_event(kind: str, *, ref_id: Optional[int] = None, note: Optional[str] = None, payload: Optional[Dict[str, Any]] = None) -> None:
-    sb = get_supabase()
-    sb.table("events").insert({
+    row = {
         "kind": kind,
         "ref_id": ref_id,
         "note": note,
         "payload_json": payload or {},
-    }).execute()
+        # 批次寫入會晚幾秒，時間以事件發生當下為準
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    buffer = _event_buffer()
+    if buffer is None:
+        get_db().table("events").insert(row).execute()
+    else:
+        buffer.add(row)
+
+def flush_events(timeout: float = 10.0) -> bool:
+    """把緩衝中的事件立刻寫出（測試或批次工作結束前使用）"""
+    return _EVENT_BUFFER.flush(timeout) if _EVENT_BUFFER is not None else True
+
+def event_buffer_stats() -> Dict[str, int]:
+    return _EVENT_BUFFER.stats() if _EVENT_BUFFER is not None else {}
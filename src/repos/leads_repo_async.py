@@ -0,0 +1,137 @@
+# src/repos/leads_repo_async.py — leads/events 的 asyncio 版本（共用一個事件迴圈與連線池）
+#
+# Streamlit 腳本本身是同步執行，所以這裡在背景執行緒跑一個常駐事件迴圈，
+# 所有非同步 Supabase 呼叫都丟到這個迴圈執行、共用同一個 httpx 連線池（keep-alive 重用連線）。
+#   - async 呼叫端：await save_lead_async(...) / upsert_lead_async(...) 等（需在本模組的迴圈上執行，可用 submit()）
+#   - 同步呼叫端：save_lead(...) / list_leads(...) / log_event(...)，簽名與 leads_repo 相同
+#   - 要重疊 I/O 與 CPU 工作：fut = submit(save_lead_async(...))；先做別的（例如產生 PDF）；再 fut.result()
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+import streamlit as st
+from supabase import AsyncClient, AsyncClientOptions, create_async_client
+
+from src.repos import leads_repo
+from src.repos.backend import get_db, use_sqlite
+from src.repos.leads_repo import build_lead_row
+from src.telemetry.tracing import span
+
+T = TypeVar("T")
+
+# 連線池上限：同一 Streamlit 行程內所有 session 共用
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE = 10
+HTTP_TIMEOUT = 10.0
+
+class _AsyncRunner:
+    """常駐背景事件迴圈 + 共用 AsyncClient；第一次 submit() 時才啟動"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[Future] = None
+
+    def start(self, credentials: Optional[Tuple[str, str]]) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="supabase-async", daemon=True).start()
+                self._loop = loop
+            if credentials is None:  # SQLite 後端：不需要 AsyncClient
+                return self._loop
+            if self._client is None or (self._client.done() and self._client.exception() is not None):
+                # 建立中的 client 以 Future 共用，併發的第一批呼叫不會重複建立；建立失敗則下次重試
+                self._client = asyncio.run_coroutine_threadsafe(_create_client(*credentials), self._loop)
+            return self._loop
+
+    async def client(self) -> AsyncClient:
+        if self._client is None:
+            raise RuntimeError("請透過 submit() 在背景事件迴圈上執行")
+        return await asyncio.wrap_future(self._client)
+
+_RUNNER = _AsyncRunner()
+
+async def _create_client(url: str, key: str) -> AsyncClient:
+    http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+        timeout=HTTP_TIMEOUT,
+    )
+    return await create_async_client(url, key, options=AsyncClientOptions(httpx_client=http))
+
+def _credentials() -> Tuple[str, str]:
+    try:
+        return st.secrets["supabase"]["url"], st.secrets["supabase"]["key"]
+    except KeyError:
+        st.error("讀取 Secrets 失敗：請到 Streamlit Cloud 的 Secrets 設定 supabase.url / supabase.key")
+        raise
+
+async def get_async_supabase() -> AsyncClient:
+    """在本模組的事件迴圈上取得共用的 AsyncClient"""
+    return await _RUNNER.client()
+
+def submit(coro: Awaitable[T]) -> "Future[T]":
+    """把 coroutine 丟到背景事件迴圈執行，立即回傳 concurrent.futures.Future"""
+    # st.secrets 在呼叫端（Streamlit 腳本執行緒）讀取
+    loop = _RUNNER.start(None if use_sqlite() else _credentials())
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+# ========= async API =========
+async def upsert_lead_async(*, name: Optional[str], email: str, phone: Optional[str], case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> Tuple[int, bool]:
+    """冪等寫入，規則同 leads_repo.upsert_lead；回傳 (lead id, 是否為新建立)"""
+    if use_sqlite():  # 本機檔案 I/O：丟到執行緒，不卡住事件迴圈
+        return await asyncio.to_thread(
+            leads_repo.upsert_lead, name=name, email=email, phone=phone, case_id=case_id, tag=tag, payload=payload
+        )
+    with span("db.save_lead_async"):
+        sb = await get_async_supabase()
+        data = build_lead_row(name=name, email=email, phone=phone, case_id=case_id, tag=tag, payload=payload)
+        key = data["dedup_key"]
+
+        res = await sb.table("leads").select("id").eq("dedup_key", key).limit(1).execute()
+        if res.data:
+            return int(res.data[0]["id"]), False  # type: ignore
+        res = await sb.table("leads").upsert(data, on_conflict="dedup_key", ignore_duplicates=True).execute()
+        if res.data:
+            return int(res.data[0]["id"]), True  # type: ignore
+        res = await sb.table("leads").select("id").eq("dedup_key", key).limit(1).execute()
+        return int(res.data[0]["id"]), False  # type: ignore
+
+async def save_lead_async(*, name: Optional[str], email: str, phone: Optional[str], case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> int:
+    """冪等寫入，規則同 leads_repo.save_lead"""
+    lead_id, _ = await upsert_lead_async(name=name, email=email, phone=phone, case_id=case_id, tag=tag, payload=payload)
+    return lead_id
+
+async def list_leads_async(limit: int = 100) -> List[Dict[str, Any]]:
+    if use_sqlite():
+        return await asyncio.to_thread(leads_repo.list_leads, limit)
+    sb = await get_async_supabase()
+    res = await sb.table("leads").select("id,name,email,phone,case_id,tag,created_at").order("id", desc=True).limit(limit).execute()
+    return list(res.data or [])  # type: ignore
+
+async def log_event_async(kind: str, *, ref_id: Optional[int] = None, note: Optional[str] = None, payload: Optional[Dict[str, Any]] = None) -> None:
+    """直接寫入（不經 event_buffer）；需要確認寫入完成時使用"""
+    row = {
+        "kind": kind,
+        "ref_id": ref_id,
+        "note": note,
+        "payload_json": payload or {},
+    }
+    if use_sqlite():
+        await asyncio.to_thread(lambda: get_db().table("events").insert(row).execute())
+        return
+    sb = await get_async_supabase()
+    await sb.table("events").insert(row).execute()
+
+# ========= 同步包裝（與 leads_repo 相同簽名） =========
+def save_lead(*, name: Optional[str], email: str, phone: Optional[str], case_id: Optional[str], tag: Optional[str], payload: Dict[str, Any]) -> int:
+    return submit(save_lead_async(name=name, email=email, phone=phone, case_id=case_id, tag=tag, payload=payload)).result()
+
+def list_leads(limit: int = 100) -> List[Dict[str, Any]]:
+    return submit(list_leads_async(limit)).result()
+
+def log_event(kind: str, *, ref_id: Optional[int] = None, note: Optional[str] = None, payload: Optional[Dict[str, Any]] = None) -> None:
+    submit(log_event_async(kind, ref_id=ref_id, note=note, payload=payload)).result()
@@ -0,0 +1,185 @@
+# src/repos/sqlite_backend.py — 本機 SQLite 替身（離線開發 / 壓力測試用）
+#
+# 實作 repo 層用到的 Supabase 查詢子集（table / select / insert / upsert / eq / gt / order / limit / execute），
+# 所以 leads_repo、event_buffer、批次匯出等程式不需要為兩種後端各寫一份。
+# 資料表結構對應 supabase.sql（events 不分區；jsonb 以 JSON 文字儲存、讀取時還原）。
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+SCHEMA = """
+create table if not exists leads (
+  id integer primary key autoincrement,
+  name text,
+  email text not null,
+  phone text,
+  case_id text,
+  tag text,
+  payload_json text,
+  dedup_key text,
+  created_at text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists leads_email_idx on leads (email);
+create unique index if not exists leads_dedup_key_uidx on leads (dedup_key);
+
+create table if not exists events (
+  id integer primary key autoincrement,
+  kind text not null,
+  ref_id integer,
+  note text,
+  payload_json text,
+  created_at text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists events_kind_created_idx on events (kind, created_at);
+create index if not exists events_ref_id_idx on events (ref_id);
+"""
+
+JSON_COLUMNS = ("payload_json",)
+TABLES = ("leads", "events")
+
+@dataclass
+class SQLiteResponse:
+    data: List[Dict[str, Any]]
+
+class SQLiteClient:
+    """執行緒安全：每個執行緒一條連線（WAL 模式下讀寫可並行，寫入由 SQLite 自行排隊）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)  # autocommit
+            conn.row_factory = sqlite3.Row
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute("pragma busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def table(self, name: str) -> "_Query":
+        if name not in TABLES:
+            raise ValueError(f"未知的資料表：{name}")
+        return _Query(self, name)
+
+class _Query:
+    """Supabase（postgrest）查詢建構器的最小相容版"""
+
+    def __init__(self, client: SQLiteClient, table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._rows: List[Dict[str, Any]] = []
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+        self._where: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+
+    # ---------- 動作 ----------
+    def select(self, columns: str = "*") -> "_Query":
+        self._op = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, rows: Union[Dict[str, Any], Sequence[Dict[str, Any]]]) -> "_Query":
+        self._op = "insert"
+        self._rows = [rows] if isinstance(rows, dict) else list(rows)
+        return self
+
+    def upsert(self, rows, *, on_conflict: str = "id", ignore_duplicates: bool = False) -> "_Query":
+        self.insert(rows)
+        self._op = "upsert"
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    # ---------- 條件 ----------
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._where.append((column, "=", value))
+        return self
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        self._where.append((column, ">", value))
+        return self
+
+    def order(self, column: str, *, desc: bool = False) -> "_Query":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, n: int) -> "_Query":
+        self._limit = int(n)
+        return self
+
+    # ---------- 執行 ----------
+    def execute(self) -> SQLiteResponse:
+        conn = self._client.connection()
+        if self._op == "select":
+            return SQLiteResponse(self._select(conn))
+        return SQLiteResponse(self._write(conn))
+
+    def _select(self, conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        cols = "*" if self._columns.strip() == "*" else ", ".join(
+            _ident(c) for c in self._columns.split(",") if c.strip()
+        )
+        sql = f"select {cols} from {self._table}"
+        params: List[Any] = []
+        if self._where:
+            sql += " where " + " and ".join(f"{_ident(c)} {op} ?" for c, op, _ in self._where)
+            params = [v for _, _, v in self._where]
+        if self._order:
+            sql += " order by " + ", ".join(f"{_ident(c)} {'desc' if d else 'asc'}" for c, d in self._order)
+        if self._limit is not None:
+            sql += f" limit {self._limit}"
+        return [_decode(dict(r)) for r in conn.execute(sql, params)]
+
+    def _write(self, conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        if not self._rows:
+            return []
+        out: List[Dict[str, Any]] = []
+        conn.execute("begin immediate")
+        try:
+            for row in self._rows:
+                cols = list(row)
+                sql = f"insert into {self._table} ({', '.join(_ident(c) for c in cols)}) values ({', '.join('?' * len(cols))})"
+                if self._op == "upsert":
+                    target = _ident(self._on_conflict or "id")
+                    if self._ignore_duplicates:
+                        sql += f" on conflict ({target}) do nothing"
+                    else:
+                        updates = ", ".join(f"{_ident(c)} = excluded.{_ident(c)}" for c in cols if c != self._on_conflict)
+                        sql += f" on conflict ({target}) do update set {updates}"
+                sql += " returning *"
+                out.extend(_decode(dict(r)) for r in conn.execute(sql, [_encode(c, row[c]) for c in cols]).fetchall())
+            conn.execute("commit")
+        except Exception:
+            conn.execute("rollback")
+            raise
+        return out
+
+def _ident(name: str) -> str:
+    name = name.strip()
+    if not name.replace("_", "").isalnum():
+        raise ValueError(f"不合法的欄位名稱：{name}")
+    return name
+
+def _encode(column: str, value: Any) -> Any:
+    if column in JSON_COLUMNS and value is not None:
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    for c in JSON_COLUMNS:
+        if isinstance(row.get(c), str):
+            row[c] = json.loads(row[c])
+    return row
@@ -0,0 +1,117 @@
+# src/tax/projection.py — 資產成長蒙地卡羅模擬：各年度遺產稅分布與現金稅源缺口機率
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.tax.tw_estate import calculate_estate_tax_batch
+
+@dataclass(frozen=True)
+class AssetGrowth:
+    drift: float        # 年化期望報酬（例：0.05 = 5%）
+    volatility: float   # 年化波動度（0 表示固定成長）
+
+@dataclass(frozen=True)
+class ProjectionConfig:
+    years: int = 30
+    paths: int = 100_000
+    realty: AssetGrowth = AssetGrowth(0.03, 0.12)
+    equities: AssetGrowth = AssetGrowth(0.06, 0.20)
+    cash: AssetGrowth = AssetGrowth(0.01, 0.0)
+    correlation: float = 0.3                 # 不動產與股票年報酬的相關係數
+    tax_year: int = 2025                     # 計稅規則（可改為各年度對應死亡年度前的最新規則）
+    percentiles: Tuple[float, ...] = (5, 25, 50, 75, 95)
+    seed: Optional[int] = None
+    chunk_paths: int = 25_000                # 每批路徑數；批次與亂數種子固定，單核/多核結果相同
+
+@dataclass(frozen=True)
+class ProjectionResult:
+    horizons: np.ndarray                      # 1..years
+    tax_percentiles_10k: Dict[float, np.ndarray]
+    total_percentiles_10k: Dict[float, np.ndarray]
+    mean_tax_10k: np.ndarray
+    gap_probability: np.ndarray               # 稅額 > 當年現金 的路徑比例
+    mean_gap_10k: np.ndarray                  # 缺口期望值（無缺口視為 0）
+    paths: int = 0
+    deductions: Dict[str, object] = field(default_factory=dict)
+
+def _simulate_chunk(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    模擬一批路徑（可在子行程執行，參數須可 pickle）。
+    回傳 (各年稅額, 各年總資產, 各年現金稅源缺口)，shape 皆為 (years, n)。
+    """
+    start, cfg, seed_seq, n, deductions = args
+    rng = np.random.default_rng(seed_seq)
+    realty, equities, cash = (np.full(n, float(v)) for v in start)
+
+    # 每年對數報酬：(μ - σ²/2) + σ·Z，不動產與股票以 Cholesky 產生相關性
+    rho = float(np.clip(cfg.correlation, -0.999, 0.999))
+    classes = (cfg.realty, cfg.equities, cfg.cash)
+    mu = [g.drift - 0.5 * g.volatility ** 2 for g in classes]
+    sig = [g.volatility for g in classes]
+
+    taxes = np.empty((cfg.years, n), dtype=np.int64)
+    totals = np.empty((cfg.years, n), dtype=np.int64)
+    gaps = np.empty((cfg.years, n), dtype=np.int64)
+    for t in range(cfg.years):
+        z = rng.standard_normal((3, n))
+        z[1] = rho * z[0] + np.sqrt(1 - rho ** 2) * z[1]
+        realty *= np.exp(mu[0] + sig[0] * z[0])
+        equities *= np.exp(mu[1] + sig[1] * z[1])
+        cash *= np.exp(mu[2] + sig[2] * z[2])
+
+        totals[t] = np.rint(realty + equities + cash)
+        _, taxes[t], _ = calculate_estate_tax_batch(cfg.tax_year, totals[t], **deductions)
+        gaps[t] = np.maximum(taxes[t] - np.rint(cash).astype(np.int64), 0)
+    return taxes, totals, gaps
+
+def project_estate_tax(
+    *,
+    realty_10k: int,
+    equities_10k: int,
+    cash_10k: int,
+    config: ProjectionConfig = ProjectionConfig(),
+    workers: Optional[int] = None,
+    **deductions,
+) -> ProjectionResult:
+    """
+    模擬 N 年內資產成長路徑，並在每個年度以累進級距計算遺產稅。
+    扣除參數同 `calculate_estate_tax`；workers > 1 時以行程池分批平行計算。
+    """
+    if config.years <= 0 or config.paths <= 0:
+        raise ValueError("years 與 paths 必須大於 0")
+
+    sizes: List[int] = []
+    remaining = config.paths
+    while remaining > 0:
+        sizes.append(min(config.chunk_paths, remaining))
+        remaining -= sizes[-1]
+    seeds = np.random.SeedSequence(config.seed).spawn(len(sizes))
+    start = (realty_10k, equities_10k, cash_10k)
+    jobs = [(start, config, s, n, deductions) for s, n in zip(seeds, sizes)]
+
+    if workers and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_simulate_chunk, jobs))
+    else:
+        chunks = [_simulate_chunk(j) for j in jobs]
+
+    taxes = np.concatenate([c[0] for c in chunks], axis=1)
+    totals = np.concatenate([c[1] for c in chunks], axis=1)
+    gaps = np.concatenate([c[2] for c in chunks], axis=1)
+
+    pcts = list(config.percentiles)
+    tax_q = np.percentile(taxes, pcts, axis=1)
+    total_q = np.percentile(totals, pcts, axis=1)
+    return ProjectionResult(
+        horizons=np.arange(1, config.years + 1),
+        tax_percentiles_10k={p: tax_q[i] for i, p in enumerate(pcts)},
+        total_percentiles_10k={p: total_q[i] for i, p in enumerate(pcts)},
+        mean_tax_10k=taxes.mean(axis=1),
+        gap_probability=(gaps > 0).mean(axis=1),
+        mean_gap_10k=gaps.mean(axis=1),
+        paths=config.paths,
+        deductions=dict(deductions),
+    )
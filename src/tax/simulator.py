@@ -0,0 +1,255 @@
+# src/tax/simulator.py — 傳承路徑模擬（三情境、KPI、流動性缺口）與結果快取
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+from src.cache.lru import LRUCache, CacheStats
+from src.telemetry.tracing import traced
+from src.tax.tw_estate import calculate_estate_tax_2025, calculate_estate_tax_2025_batch, tax_bracket_index_batch
+
+def _saving_rates(prefer: str, overseas: str) -> Tuple[float, float]:
+    """保單 / 信託的節稅效果係數（示意）"""
+    save_policy = 0.55
+    save_trust  = 0.48
+    if prefer == "節稅優先":
+        save_policy += 0.03; save_trust += 0.02
+    elif prefer == "降低家族爭議":
+        save_trust  += 0.03
+    if overseas != "無":
+        save_trust  += 0.03
+    return save_policy, save_trust
+
+# 三情境（效果係數示意；後續可逐步替換成精算模型）
+@traced("tax.simulate_scenarios")
+def simulate_scenarios(prefer: str, overseas: str, base_tax_10k: int) -> Dict[str, Dict[str, Any]]:
+    save_policy, save_trust = _saving_rates(prefer, overseas)
+
+    policy_tax = max(int(round(base_tax_10k * (1 - save_policy))), 0)
+    trust_tax  = max(int(round(base_tax_10k * (1 - save_trust))),  0)
+
+    return {
+        "不規劃（基準）": {"total_tax": base_tax_10k, "note": "依法課稅（2025 正式級距，含免稅與扣除）。"},
+        "保單規劃":       {"total_tax": policy_tax,   "note": "以保單現金價值預留稅源池、提升流動性（示意）。"},
+        "信託規劃":       {"total_tax": trust_tax,    "note": "信託條款可納教育/慈善與跨境合規（示意）。"},
+    }
+
+def derive_kpi(comparisons: Dict[str, Dict[str, Any]]) -> Tuple[str, int, int, str]:
+    """從情境比較推 KPI：最佳方案 / 節省金額 / 基準稅額 / 降幅%"""
+    # 找 baseline
+    base_key = None
+    for k in comparisons:
+        if "不規劃" in k or "基準" in k:
+            base_key = k
+            break
+    if base_key is None:
+        base_key = max(comparisons, key=lambda x: comparisons[x].get("total_tax", 0))
+
+    base_tax = int(comparisons[base_key].get("total_tax", 0))
+    # 找最低
+    best_key = min(comparisons, key=lambda x: comparisons[x].get("total_tax", 10**9))
+    best_tax = int(comparisons[best_key].get("total_tax", 0))
+    saved = max(base_tax - best_tax, 0)
+    pct = f"{round(saved / base_tax * 100)}%" if base_tax > 0 else "-"
+    return best_key, saved, base_tax, pct
+
+def liquidity_gap(tax_need_10k: int, cash_10k: int) -> Tuple[int, str]:
+    """流動性缺口（需要稅源 - 現金），<0 表足額"""
+    gap = tax_need_10k - cash_10k
+    if gap <= 0:
+        return 0, "現金足以覆蓋稅款"
+    return gap, f"現金不足 {gap} 萬，建議規劃稅源池（保單/信託）"
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 結果快取：以正規化後的表單輸入為 key，Streamlit 每次 rerun 直接取用
+# ────────────────────────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class SimInputs:
+    """影響計算結果的表單欄位（正規化後可雜湊，作為快取 key）"""
+    members: Tuple[str, ...]
+    overseas: str
+    prefer: str
+    has_spouse: bool
+    adult_children: int
+    parents: int
+    disabled_people: int
+    other_dependents: int
+    realty: int
+    equities: int
+    cash: int
+
+    @classmethod
+    def normalize(cls, *, members, overseas, prefer, has_spouse, adult_children, parents,
+                  disabled_people, other_dependents, realty, equities, cash) -> "SimInputs":
+        return cls(
+            members=tuple(members or ()),
+            overseas=str(overseas),
+            prefer=str(prefer),
+            has_spouse=bool(has_spouse),
+            adult_children=int(adult_children),
+            parents=int(parents),
+            disabled_people=int(disabled_people),
+            other_dependents=int(other_dependents),
+            realty=int(realty),
+            equities=int(equities),
+            cash=int(cash),
+        )
+
+    @property
+    def total_10k(self) -> int:
+        return self.realty + self.equities + self.cash
+
+@dataclass(frozen=True)
+class SimResult:
+    taxable_10k: int
+    base_tax_10k: int
+    deduct_10k: int
+    comparisons: Dict[str, Dict[str, Any]]
+    best_key: str
+    saved_10k: int
+    base_tax_show_10k: int
+    pct: str
+    gap_10k: int
+    gap_note: str
+
+    @property
+    def result_summary(self) -> Dict[str, Any]:
+        return {
+            "最佳方案（示意）": self.best_key,
+            "基準稅額": f"{self.base_tax_show_10k} 萬",
+            "預估可節省": f"{self.saved_10k} 萬（{self.pct}）",
+            "現金稅源檢視": self.gap_note,
+        }
+
+    @property
+    def pdf_comparisons(self) -> Dict[str, Dict[str, Any]]:
+        return {k: {"total_tax": int(v["total_tax"]), "note": v.get("note", "")} for k, v in self.comparisons.items()}
+
+def run_simulation(inp: SimInputs) -> SimResult:
+    """完整計算一次（稅額 → 三情境 → KPI → 流動性缺口），不經快取。"""
+    taxable_10k, base_tax_10k, deduct_10k = calculate_estate_tax_2025(
+        inp.total_10k,
+        has_spouse=inp.has_spouse,
+        adult_children=inp.adult_children,
+        parents=inp.parents,
+        disabled_people=inp.disabled_people,
+        other_dependents=inp.other_dependents,
+    )
+    comparisons = simulate_scenarios(inp.prefer, inp.overseas, base_tax_10k)
+    best_key, saved_10k, base_tax_show_10k, pct = derive_kpi(comparisons)
+    gap_10k, gap_note = liquidity_gap(base_tax_show_10k, inp.cash)
+    return SimResult(
+        taxable_10k=taxable_10k,
+        base_tax_10k=base_tax_10k,
+        deduct_10k=deduct_10k,
+        comparisons=comparisons,
+        best_key=best_key,
+        saved_10k=saved_10k,
+        base_tax_show_10k=base_tax_show_10k,
+        pct=pct,
+        gap_10k=gap_10k,
+        gap_note=gap_note,
+    )
+
+# 模組層級：同一個 Streamlit 行程內所有 session 共用
+_SCENARIO_CACHE: LRUCache[SimResult] = LRUCache(maxsize=1024)
+
+def run_simulation_cached(inp: SimInputs) -> SimResult:
+    """同一組輸入只算一次；結果物件為唯讀共用，呼叫端請勿修改其中的 dict。"""
+    return _SCENARIO_CACHE.get_or_compute(inp, lambda: run_simulation(inp))
+
+def scenario_cache_stats() -> CacheStats:
+    return _SCENARIO_CACHE.stats()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 敏感度分析：兩個變數各取一排值，整張網格一次向量化計算
+# ────────────────────────────────────────────────────────────────────────────────
+SWEEP_AXES: Dict[str, str] = {
+    "不動產": "realty",
+    "股票/基金": "equities",
+    "現金/存款": "cash",
+    "成年子女數": "adult_children",
+}
+MAX_SWEEP_STEPS = 200
+
+def simulate_scenarios_batch(prefer: str, overseas: str, base_tax_10k: np.ndarray) -> Dict[str, np.ndarray]:
+    """`simulate_scenarios` 的陣列版（只回傳各情境稅額；四捨五入方式相同）。"""
+    save_policy, save_trust = _saving_rates(prefer, overseas)
+    base = np.asarray(base_tax_10k, dtype=np.int64)
+    return {
+        "不規劃（基準）": base,
+        "保單規劃":       np.maximum(np.rint(base * (1 - save_policy)).astype(np.int64), 0),
+        "信託規劃":       np.maximum(np.rint(base * (1 - save_trust)).astype(np.int64), 0),
+    }
+
+@dataclass(frozen=True)
+class SensitivityGrid:
+    x_axis: str
+    y_axis: str
+    x_values: np.ndarray        # shape (nx,)
+    y_values: np.ndarray        # shape (ny,)
+    base_tax_10k: np.ndarray    # 以下皆為 shape (ny, nx)
+    best_tax_10k: np.ndarray
+    saved_10k: np.ndarray
+    gap_10k: np.ndarray
+    bracket: np.ndarray         # 基準情境的累進級距序號
+    bracket_edge: np.ndarray    # 與左方或下方相鄰格不同級距 → 級距分界線
+
+def sensitivity_grid(
+    inp: SimInputs,
+    x_axis: str, x_values: Sequence[int],
+    y_axis: str, y_values: Sequence[int],
+) -> SensitivityGrid:
+    """
+    以 `inp` 為基準，把 x_axis / y_axis（SWEEP_AXES 的中文名稱）分別換成各值，
+    一次算出整張網格的基準稅額、最佳方案稅額、節省金額、現金稅源缺口與級距。
+    """
+    if x_axis == y_axis:
+        raise ValueError("兩個軸必須是不同變數")
+    xs = np.asarray(x_values, dtype=np.int64)
+    ys = np.asarray(y_values, dtype=np.int64)
+    if len(xs) > MAX_SWEEP_STEPS or len(ys) > MAX_SWEEP_STEPS:
+        raise ValueError(f"每個軸最多 {MAX_SWEEP_STEPS} 個取值")
+
+    fields = {
+        "realty": np.int64(inp.realty),
+        "equities": np.int64(inp.equities),
+        "cash": np.int64(inp.cash),
+        "adult_children": np.int64(inp.adult_children),
+    }
+    fields[SWEEP_AXES[x_axis]] = xs[np.newaxis, :]
+    fields[SWEEP_AXES[y_axis]] = ys[:, np.newaxis]
+
+    total = fields["realty"] + fields["equities"] + fields["cash"]
+    taxable, base_tax, _ = calculate_estate_tax_2025_batch(
+        total,
+        has_spouse=inp.has_spouse,
+        adult_children=fields["adult_children"],
+        parents=inp.parents,
+        disabled_people=inp.disabled_people,
+        other_dependents=inp.other_dependents,
+    )
+    shape = (len(ys), len(xs))
+    base_tax = np.broadcast_to(base_tax, shape)
+    scenarios = simulate_scenarios_batch(inp.prefer, inp.overseas, base_tax)
+    best_tax = np.minimum.reduce(list(scenarios.values()))
+    gap = np.maximum(base_tax - np.broadcast_to(fields["cash"], shape), 0)
+
+    bracket = np.broadcast_to(tax_bracket_index_batch(2025, taxable), shape)
+    edge = np.zeros(shape, dtype=bool)
+    edge[:, 1:] |= bracket[:, 1:] != bracket[:, :-1]
+    edge[1:, :] |= bracket[1:, :] != bracket[:-1, :]
+
+    return SensitivityGrid(
+        x_axis=x_axis,
+        y_axis=y_axis,
+        x_values=xs,
+        y_values=ys,
+        base_tax_10k=base_tax,
+        best_tax_10k=best_tax,
+        saved_10k=base_tax - best_tax,
+        gap_10k=gap,
+        bracket=bracket,
+        bracket_edge=edge,
+    )
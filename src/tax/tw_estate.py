@@ -1,38 +1,169 @@
 # src/tax/tw_estate.py
 from __future__ import annotations
-from typing import Tuple
-
-# 常數（單位：萬元）
-EXEMPT_10K                = 1333   # 免稅額
-FUNERAL_10K               = 138    # 喪葬費扣除
-SPOUSE_DEDUCT_10K         = 553    # 配偶扣除
-ADULT_CHILD_DEDUCT_10K    = 56     # 直系卑親屬（成年子女等）每人
-PARENTS_DEDUCT_10K        = 138    # 父母每人
-DISABLED_DEDUCT_10K       = 693    # 重度以上身心障礙每人
-OTHER_DEPENDENTS_10K      = 56     # 其他受扶養（兄弟姊妹、祖父母）每人
-
-# 級距（轉為「元」後算更精準），門檻金額（元）
-B1 = 56_210_000
-B2 = 112_420_000
-
-def _progressive_tax_from_net_10k(net_10k: int) -> int:
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.telemetry.tracing import traced
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 稅制規則表（依「死亡年度」生效；單位：扣除額為萬元、級距門檻為元）
+# 新年度公告時只需在下方 register_tax_rules(...) 新增一組，不必改計算邏輯。
+# ────────────────────────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class EstateTaxRules:
+    effective_year: int                  # 自該年度起適用，直到下一組規則生效
+    exempt_10k: int                      # 免稅額
+    funeral_10k: int                     # 喪葬費扣除
+    spouse_10k: int                      # 配偶扣除
+    adult_child_10k: int                 # 直系卑親屬（成年子女等）每人
+    parents_10k: int                     # 父母每人
+    disabled_10k: int                    # 重度以上身心障礙每人
+    other_dependents_10k: int            # 其他受扶養（兄弟姊妹、祖父母）每人
+    brackets: Tuple[Tuple[Optional[int], float], ...]  # (級距上限_元，最後一級為 None, 稅率)
+
+@dataclass(frozen=True, eq=False)
+class _CompiledRules:
+    """規則在 import 時編譯好的查表形式：累積稅額級距表 + 批次用稅額表。"""
+    rules: EstateTaxRules
+    uppers: Tuple[int, ...]      # 各級距上限（元），供 bisect
+    lowers: Tuple[int, ...]      # 各級距下限（元）
+    offsets: Tuple[float, ...]   # 各級距起點的累積稅額（元）
+    rates: Tuple[float, ...]     # 邊際稅率
+    tax_table_10k: np.ndarray    # 課稅淨額 0.._TAX_TABLE_MAX_NET_10K 萬元對應的稅額（萬元）
+
+    def deduct_total_10k(
+        self, *, has_spouse: bool, adult_children: int, parents: int, disabled_people: int, other_dependents: int
+    ) -> int:
+        r = self.rules
+        # 扣除總額（含免稅）= 免稅額 + 各項扣除
+        return (
+            r.exempt_10k + r.funeral_10k
+            + (r.spouse_10k if has_spouse else 0)
+            + adult_children * r.adult_child_10k
+            + parents * r.parents_10k
+            + disabled_people * r.disabled_10k
+            + other_dependents * r.other_dependents_10k
+        )
+
+# 課稅淨額 20 億（萬元計）以內直接查表；超出範圍的少數筆再回到逐級公式計算
+_TAX_TABLE_MAX_NET_10K = 200_000
+
+_REGISTRY: Dict[int, _CompiledRules] = {}
+_REGISTRY_YEARS: List[int] = []
+
+def _compile_rules(rules: EstateTaxRules) -> _CompiledRules:
+    uppers = tuple(u for u, _ in rules.brackets[:-1])
+    rates = tuple(rate for _, rate in rules.brackets)
+    if rules.brackets[-1][0] is not None or any(u is None for u in uppers):
+        raise ValueError("只有最後一個級距的上限可以是 None")
+    if list(uppers) != sorted(uppers) or list(rates) != sorted(rates):
+        raise ValueError("級距上限與稅率都必須遞增")
+
+    lowers = (0,) + uppers
+    # 累積稅額以 Decimal 精算後再轉 float，避免 0.1 之類的稅率在累加時產生誤差
+    offsets = [Decimal(0)]
+    for i in range(1, len(lowers)):
+        offsets.append(offsets[-1] + (lowers[i] - lowers[i - 1]) * Decimal(str(rates[i - 1])))
+
+    compiled = _CompiledRules(
+        rules=rules,
+        uppers=uppers,
+        lowers=lowers,
+        offsets=tuple(float(o) for o in offsets),
+        rates=rates,
+        tax_table_10k=np.empty(0, dtype=np.int64),
+    )
+    table = _progressive_tax_from_net_10k_batch(np.arange(_TAX_TABLE_MAX_NET_10K + 1), compiled)
+    return replace(compiled, tax_table_10k=table)
+
+def register_tax_rules(rules: EstateTaxRules) -> None:
+    """登錄（或覆寫）一組年度規則；會立即編譯成級距表。"""
+    compiled = _compile_rules(rules)
+    if rules.effective_year not in _REGISTRY:
+        _REGISTRY_YEARS.insert(bisect_left(_REGISTRY_YEARS, rules.effective_year), rules.effective_year)
+    _REGISTRY[rules.effective_year] = compiled
+
+def _compiled_for_year(year: int) -> _CompiledRules:
+    i = bisect_right(_REGISTRY_YEARS, year) - 1
+    if i < 0:
+        raise ValueError(f"{year} 年度早於已登錄的稅制規則（最早 {_REGISTRY_YEARS[0]} 年）")
+    return _REGISTRY[_REGISTRY_YEARS[i]]
+
+def get_tax_rules(year: int) -> EstateTaxRules:
+    """取得該死亡年度適用的規則（最近一個生效年度 ≤ year 的那組）。"""
+    return _compiled_for_year(year).rules
+
+def registered_tax_years() -> List[int]:
+    return list(_REGISTRY_YEARS)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 計算
+# ────────────────────────────────────────────────────────────────────────────────
+def _progressive_tax_from_net_10k(net_10k: int, compiled: Optional[_CompiledRules] = None) -> int:
     """
-    將課稅遺產淨額（萬元）換算為元後按 10% / 15% / 20% 級距計稅，再換回萬元（四捨五入）。
+    將課稅遺產淨額（萬元）換算為元後按累進級距計稅，再換回萬元（四捨五入）。
+    級距以 bisect 查表：稅額 = 該級距起點的累積稅額 + 超額 × 邊際稅率。
     """
+    c = compiled or _COMPILED_2025
     taxable = max(net_10k, 0) * 10_000
-    if taxable <= 0:
-        tax = 0
-    elif taxable <= B1:
-        tax = taxable * 0.10
-    elif taxable <= B2:
-        tax = 5_621_000 + (taxable - B1) * 0.15
-        # 等價：tax = taxable * 0.15 - 2_210_500
-    else:
-        tax = 14_052_500 + (taxable - B2) * 0.20
-        # 等價：tax = taxable * 0.20 - 8_431_500
+    i = bisect_left(c.uppers, taxable)
+    tax = c.offsets[i] + (taxable - c.lowers[i]) * c.rates[i]
     return int(round(tax / 10_000))  # 回傳萬元
 
-def calculate_estate_tax_2025(
+def _max_net_for_tax_10k(target_tax_10k: int, compiled: Optional[_CompiledRules] = None) -> int:
+    """
+    反推：稅額（萬元）不超過 target 的最大課稅淨額（萬元）。
+    先以 bisect 找出「target + 0.5 萬」落在哪個級距（比較各級距上限的累積稅額），代回該段直線求解，
+    再用正向函數校正四捨五入造成的 ±1 萬誤差；稅額對淨額單調不減，因此結果是精確解。
+    """
+    c = compiled or _COMPILED_2025
+    if target_tax_10k < 0:
+        raise ValueError("目標稅額不可為負數")
+    limit = (target_tax_10k + 0.5) * 10_000  # 四捨五入後仍 ≤ target 的稅額上限（元）
+    i = bisect_left(c.offsets[1:], limit)
+    net = int((c.lowers[i] + (limit - c.offsets[i]) / c.rates[i]) // 10_000)
+    while _progressive_tax_from_net_10k(net + 1, c) <= target_tax_10k:
+        net += 1
+    while net > 0 and _progressive_tax_from_net_10k(net, c) > target_tax_10k:
+        net -= 1
+    return net
+
+def _progressive_tax_from_net_10k_batch(net_10k, compiled: Optional[_CompiledRules] = None) -> np.ndarray:
+    """
+    `_progressive_tax_from_net_10k` 的向量化版本（輸入/輸出皆為萬元 int64 陣列）。
+
+    累進稅率遞增，稅額函數為各級距直線的上包絡：取各段「累積稅額 + 超額 × 稅率」的最大值，
+    即等於該筆所在級距的那一段，浮點運算順序也與純 Python 版相同（金額遠小於 2**53，轉 float 不失真）；
+    np.rint 與 round() 同為「四捨六入五成雙」，因此逐筆結果完全一致。
+    """
+    c = compiled or _COMPILED_2025
+    net = np.asarray(net_10k, dtype=np.int64)
+    taxable = np.maximum(net.reshape(-1), 0) * 10_000.0
+    tax = taxable * c.rates[0]
+    buf = np.empty_like(taxable)
+    for lower, offset, rate in zip(c.lowers[1:], c.offsets[1:], c.rates[1:]):
+        np.subtract(taxable, lower, out=buf)
+        np.multiply(buf, rate, out=buf)
+        np.add(buf, offset, out=buf)
+        np.maximum(tax, buf, out=tax)
+    np.divide(tax, 10_000, out=tax)
+    return np.rint(tax, out=tax).astype(np.int64).reshape(net.shape)
+
+def _tax_from_net_10k_lookup(net_10k: np.ndarray, compiled: _CompiledRules) -> np.ndarray:
+    """以預先算好的稅額表取代逐筆計算；結果與 `_progressive_tax_from_net_10k_batch` 相同。"""
+    net = np.asarray(net_10k, dtype=np.int64).reshape(-1)
+    tax_10k = np.take(compiled.tax_table_10k, np.clip(net, 0, _TAX_TABLE_MAX_NET_10K))
+    over = net > _TAX_TABLE_MAX_NET_10K
+    if over.any():
+        tax_10k[over] = _progressive_tax_from_net_10k_batch(net[over], compiled)
+    return tax_10k.reshape(np.shape(net_10k))
+
+def calculate_estate_tax(
+    year: int,
     total_assets_10k: int,
     *,
     has_spouse: bool = False,
@@ -42,25 +173,173 @@ def calculate_estate_tax_2025(
     other_dependents: int = 0
 ) -> Tuple[int, int, int]:
     """
+    依死亡年度適用的規則計稅。
     回傳 (課稅遺產淨額_萬元, 應納遺產稅_萬元, 扣除總額_萬元)
-
-    ⚠️ 扣除總額 = 免稅額 + 各項扣除（喪葬、配偶、成年子女、父母、身障、其他受扶養）
     """
-    # 各項扣除（不含免稅額）
-    deductions_10k = FUNERAL_10K
-    if has_spouse:
-        deductions_10k += SPOUSE_DEDUCT_10K
-    deductions_10k += adult_children * ADULT_CHILD_DEDUCT_10K
-    deductions_10k += parents * PARENTS_DEDUCT_10K
-    deductions_10k += disabled_people * DISABLED_DEDUCT_10K
-    deductions_10k += other_dependents * OTHER_DEPENDENTS_10K
-
-    # 扣除總額（含免稅）
-    deduct_total_10k = EXEMPT_10K + deductions_10k
+    c = _compiled_for_year(year)
+    deduct_total_10k = c.deduct_total_10k(
+        has_spouse=has_spouse,
+        adult_children=adult_children,
+        parents=parents,
+        disabled_people=disabled_people,
+        other_dependents=other_dependents,
+    )
 
     # 課稅遺產淨額
     taxable_net_10k = max(total_assets_10k - deduct_total_10k, 0)
 
     # 應納稅額（萬元）
-    tax_10k = _progressive_tax_from_net_10k(taxable_net_10k)
+    tax_10k = _progressive_tax_from_net_10k(taxable_net_10k, c)
     return taxable_net_10k, tax_10k, deduct_total_10k
+
+def calculate_estate_tax_by_year(
+    years: Iterable[int], total_assets_10k: int, **deductions
+) -> Dict[int, Tuple[int, int, int]]:
+    """同一情境在不同死亡年度下的結果並列（例：{2023: (...), 2025: (...)}）。"""
+    return {y: calculate_estate_tax(y, total_assets_10k, **deductions) for y in years}
+
+@traced("tax.calculate_estate_tax_2025")
+def calculate_estate_tax_2025(
+    total_assets_10k: int,
+    *,
+    has_spouse: bool = False,
+    adult_children: int = 0,
+    parents: int = 0,
+    disabled_people: int = 0,
+    other_dependents: int = 0
+) -> Tuple[int, int, int]:
+    """
+    回傳 (課稅遺產淨額_萬元, 應納遺產稅_萬元, 扣除總額_萬元)
+
+    ⚠️ 扣除總額 = 免稅額 + 各項扣除（喪葬、配偶、成年子女、父母、身障、其他受扶養）
+    """
+    return calculate_estate_tax(
+        2025,
+        total_assets_10k,
+        has_spouse=has_spouse,
+        adult_children=adult_children,
+        parents=parents,
+        disabled_people=disabled_people,
+        other_dependents=other_dependents,
+    )
+
+def calculate_estate_tax_batch(
+    year: int,
+    total_assets_10k,
+    *,
+    has_spouse=False,
+    adult_children=0,
+    parents=0,
+    disabled_people=0,
+    other_dependents=0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    `calculate_estate_tax` 的批次版：各參數可為純量或可廣播的陣列（例如整份名單的資產與人數欄位）。
+    回傳 (課稅遺產淨額_萬元, 應納遺產稅_萬元, 扣除總額_萬元) 三個 int64 陣列。
+    """
+    c = _compiled_for_year(year)
+    r = c.rules
+    total = np.asarray(total_assets_10k, dtype=np.int64)
+    counts = [
+        (has_spouse, r.spouse_10k),
+        (adult_children, r.adult_child_10k),
+        (parents, r.parents_10k),
+        (disabled_people, r.disabled_10k),
+        (other_dependents, r.other_dependents_10k),
+    ]
+    shape = np.broadcast_shapes(total.shape, *(np.shape(n) for n, _ in counts))
+
+    # 扣除總額（含免稅）：在同一個緩衝區內累加，避免百萬筆時產生大量暫存陣列
+    deduct_total_10k = np.full(shape, r.exempt_10k + r.funeral_10k, dtype=np.int64)
+    for n, per_head in counts:
+        deduct_total_10k += np.asarray(n, dtype=np.int64) * per_head
+
+    taxable_net_10k = np.asarray(np.maximum(total - deduct_total_10k, 0))
+    tax_10k = _tax_from_net_10k_lookup(taxable_net_10k, c)
+    return taxable_net_10k, tax_10k, deduct_total_10k
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 反推（給定目標稅額或級距 → 資產上限 / 需移轉金額）
+# ────────────────────────────────────────────────────────────────────────────────
+def max_assets_for_tax(target_tax_10k: int, *, year: int = 2025, **deductions) -> int:
+    """應納稅額不超過 target（萬元）時，總資產最多可到多少（萬元）。扣除參數同 `calculate_estate_tax`。"""
+    c = _compiled_for_year(year)
+    return c.deduct_total_10k(**_deduction_kwargs(deductions)) + _max_net_for_tax_10k(target_tax_10k, c)
+
+def max_assets_in_bracket(bracket: int, *, year: int = 2025, **deductions) -> Optional[int]:
+    """
+    課稅淨額仍落在第 bracket 級（0 起算；0 = 10% 級距）以內時，總資產最多可到多少（萬元）。
+    最高級距沒有上限，回傳 None。
+    """
+    c = _compiled_for_year(year)
+    if not 0 <= bracket < len(c.rates):
+        raise ValueError(f"級距序號需介於 0 與 {len(c.rates) - 1} 之間")
+    if bracket == len(c.uppers):
+        return None
+    return c.deduct_total_10k(**_deduction_kwargs(deductions)) + c.uppers[bracket] // 10_000
+
+def gift_to_reach_tax(total_assets_10k: int, target_tax_10k: int, *, year: int = 2025, **deductions) -> int:
+    """需先移轉（贈與等）多少萬元，遺產稅才會降到 target 以下；已達標回傳 0。"""
+    return max(total_assets_10k - max_assets_for_tax(target_tax_10k, year=year, **deductions), 0)
+
+def gift_to_reach_bracket(total_assets_10k: int, bracket: int, *, year: int = 2025, **deductions) -> int:
+    """需先移轉多少萬元，課稅淨額才會回到第 bracket 級以內；已達標回傳 0。"""
+    cap = max_assets_in_bracket(bracket, year=year, **deductions)
+    return 0 if cap is None else max(total_assets_10k - cap, 0)
+
+def _deduction_kwargs(deductions: Dict[str, object]) -> Dict[str, object]:
+    allowed = ("has_spouse", "adult_children", "parents", "disabled_people", "other_dependents")
+    unknown = set(deductions) - set(allowed)
+    if unknown:
+        raise TypeError(f"未知的扣除參數：{', '.join(sorted(unknown))}")
+    return {
+        "has_spouse": bool(deductions.get("has_spouse", False)),
+        "adult_children": int(deductions.get("adult_children", 0)),
+        "parents": int(deductions.get("parents", 0)),
+        "disabled_people": int(deductions.get("disabled_people", 0)),
+        "other_dependents": int(deductions.get("other_dependents", 0)),
+    }
+
+def tax_bracket_index_batch(year: int, net_10k) -> np.ndarray:
+    """課稅淨額（萬元）所在的級距序號（0 起算；淨額為 0 時也歸在第 0 級）。"""
+    c = _compiled_for_year(year)
+    taxable = np.asarray(net_10k, dtype=np.int64) * 10_000
+    idx = np.zeros(taxable.shape, dtype=np.int64)
+    for upper in c.uppers:
+        idx += taxable > upper
+    return idx
+
+def calculate_estate_tax_2025_batch(total_assets_10k, **deductions) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`calculate_estate_tax_2025` 的批次版（參數同 `calculate_estate_tax_batch`）。"""
+    return calculate_estate_tax_batch(2025, total_assets_10k, **deductions)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 已公告規則
+# ────────────────────────────────────────────────────────────────────────────────
+# 2022–2023 年死亡：級距 5,000 萬 / 1 億
+register_tax_rules(EstateTaxRules(
+    effective_year=2022,
+    exempt_10k=1333, funeral_10k=123, spouse_10k=493, adult_child_10k=50,
+    parents_10k=123, disabled_10k=618, other_dependents_10k=50,
+    brackets=((50_000_000, 0.10), (100_000_000, 0.15), (None, 0.20)),
+))
+# 2024 年起（含 2025）：級距 5,621 萬 / 1 億 1,242 萬
+register_tax_rules(EstateTaxRules(
+    effective_year=2024,
+    exempt_10k=1333, funeral_10k=138, spouse_10k=553, adult_child_10k=56,
+    parents_10k=138, disabled_10k=693, other_dependents_10k=56,
+    brackets=((56_210_000, 0.10), (112_420_000, 0.15), (None, 0.20)),
+))
+
+_COMPILED_2025 = _compiled_for_year(2025)
+
+# 舊版模組常數（2025 適用值），保留給既有呼叫端
+_RULES_2025               = _COMPILED_2025.rules
+EXEMPT_10K                = _RULES_2025.exempt_10k            # 免稅額
+FUNERAL_10K               = _RULES_2025.funeral_10k           # 喪葬費扣除
+SPOUSE_DEDUCT_10K         = _RULES_2025.spouse_10k            # 配偶扣除
+ADULT_CHILD_DEDUCT_10K    = _RULES_2025.adult_child_10k       # 直系卑親屬（成年子女等）每人
+PARENTS_DEDUCT_10K        = _RULES_2025.parents_10k           # 父母每人
+DISABLED_DEDUCT_10K       = _RULES_2025.disabled_10k          # 重度以上身心障礙每人
+OTHER_DEPENDENTS_10K      = _RULES_2025.other_dependents_10k  # 其他受扶養（兄弟姊妹、祖父母）每人
+B1, B2 = _COMPILED_2025.uppers                                # 級距門檻金額（元）
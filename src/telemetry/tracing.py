@@ -0,0 +1,128 @@
+# src/telemetry/tracing.py — 輕量計時：各階段 span 的耗時分位數（行程內彙總，可選擇寫入 events）
+#
+#   with span("db.save_lead"):
+#       ...
+#   @traced("tax.simulate_scenarios")
+#   def simulate_scenarios(...): ...
+#
+# 每個 span 名稱只保留最近 WINDOW 筆耗時（環形緩衝），分位數以這段視窗計算；
+# 本模組不依賴 Streamlit / 資料庫，計稅等純計算模組也能放心引用。
+from __future__ import annotations
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, TypeVar
+
+import numpy as np
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+WINDOW = 2048
+PERCENTILES = (50, 90, 99)
+
+class _SpanStats:
+    __slots__ = ("samples", "count", "errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=WINDOW)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+class SpanRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: Dict[str, _SpanStats] = {}
+        # 選用：定期把彙總寫到 events（由 enable_persistence 設定）
+        self._sink: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._interval = 60.0
+        self._last_flush = time.monotonic()
+
+    def record(self, name: str, ms: float, *, error: bool = False) -> None:
+        with self._lock:
+            s = self._spans.get(name)
+            if s is None:
+                s = self._spans[name] = _SpanStats()
+            s.samples.append(ms)
+            s.count += 1
+            s.total_ms += ms
+            s.max_ms = max(s.max_ms, ms)
+            if error:
+                s.errors += 1
+            due = self._sink is not None and time.monotonic() - self._last_flush >= self._interval
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self._persist()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{span 名稱: {count, errors, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}"""
+        with self._lock:
+            snapshot = {k: (list(s.samples), s.count, s.errors, s.total_ms, s.max_ms) for k, s in self._spans.items()}
+        out: Dict[str, Dict[str, float]] = {}
+        for name, (samples, count, errors, total, mx) in sorted(snapshot.items()):
+            qs = np.percentile(samples, PERCENTILES) if samples else [0.0] * len(PERCENTILES)
+            row = {"count": count, "errors": errors, "mean_ms": round(total / count, 3) if count else 0.0}
+            row.update({f"p{p}_ms": round(float(q), 3) for p, q in zip(PERCENTILES, qs)})
+            row["max_ms"] = round(mx, 3)
+            out[name] = row
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def enable_persistence(self, sink: Callable[[Dict[str, Any]], None], interval: float = 60.0) -> None:
+        """每 interval 秒（在下一個 span 結束時）呼叫 sink(彙總)；重複呼叫只會更新設定"""
+        with self._lock:
+            self._sink = sink
+            self._interval = interval
+
+    def _persist(self) -> None:
+        sink = self._sink
+        if sink is None:
+            return
+        try:
+            sink({"window": WINDOW, "spans": self.summary()})
+        except Exception:
+            pass  # 計時資料寫不進去不影響主流程
+
+_RECORDER = SpanRecorder()
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _RECORDER.record(name, (time.perf_counter() - t0) * 1000, error=error)
+
+def traced(name: str) -> Callable[[F], F]:
+    """函式版 span（名稱建議用「模組.函式」）"""
+    def deco(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return deco
+
+def record(name: str, ms: float, *, error: bool = False) -> None:
+    """記錄非 with 區塊量到的耗時（例如排隊等待時間）"""
+    _RECORDER.record(name, ms, error=error)
+
+def span_summary() -> Dict[str, Dict[str, float]]:
+    return _RECORDER.summary()
+
+def reset_spans() -> None:
+    _RECORDER.reset()
+
+def enable_persistence(sink: Callable[[Dict[str, Any]], None], interval: float = 60.0) -> None:
+    _RECORDER.enable_persistence(sink, interval)
@@ -7,15 +7,157 @@ create table if not exists leads (
   case_id text,
   tag text,
   payload_json jsonb,
+  dedup_key text,
   created_at timestamptz default now()
 );
 
+create index if not exists leads_email_idx on leads (email);
+
+-- 冪等寫入：dedup_key = sha256(正規化 email + case_id + tag + payload 雜湊)，由應用端計算
+-- 重複送出只查一次唯一索引，不再另存一份 payload_json（舊資料 dedup_key 為 null，不受限制）
+alter table leads add column if not exists dedup_key text;
+create unique index if not exists leads_dedup_key_uidx on leads (dedup_key);
+
 -- events 事件表（下載、聊天、提交等）
+-- 依 created_at 按月分區：舊資料清理 / 查詢只碰到相關月份；主鍵需包含分區鍵
 create table if not exists events (
-  id bigserial primary key,
+  id bigserial,
   kind text not null,          -- e.g. download_pdf / chat / submit_form
   ref_id bigint,               -- 關聯的 lead id（可為 null）
   note text,
   payload_json jsonb,
-  created_at timestamptz default now()
+  created_at timestamptz not null default now(),
+  primary key (id, created_at)
+) partition by range (created_at);
+
+-- 建立本月起往後 months_ahead 個月的月分區（重複執行無副作用）
+-- 排程沒跑到時，超出已建月份的事件會先落在 events_default；這時不能直接 create ... partition of
+-- （default 分區已有該範圍的資料會失敗），所以先建獨立表、把該月資料從 default 搬過去，再 attach。
+create or replace function ensure_events_partitions(months_ahead int default 3)
+returns void language plpgsql as $$
+declare
+  m date;
+  m_end date;
+  part text;
+begin
+  for i in 0..months_ahead loop
+    m := (date_trunc('month', now()) + make_interval(months => i))::date;
+    m_end := (m + interval '1 month')::date;
+    part := format('events_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'));
+    if to_regclass(part) is null then
+      execute format('create table %I (like events including defaults including constraints)', part);
+      if to_regclass('events_default') is not null then
+        execute format(
+          'with moved as (delete from events_default where created_at >= %L and created_at < %L returning *)
+           insert into %I select * from moved',
+          m, m_end, part
+        );
+      end if;
+      execute format(
+        'alter table events attach partition %I for values from (%L) to (%L)',
+        part, m, m_end
+      );
+    end if;
+  end loop;
+end $$;
+
+-- 舊版（未分區）的 events 表：改名後建立分區表並搬移資料（只會執行一次）
+do $$
+begin
+  if exists (select 1 from pg_class c join pg_namespace n on n.oid = c.relnamespace
+             where n.nspname = 'public' and c.relname = 'events' and c.relkind = 'r') then
+    alter table events rename to events_unpartitioned;
+    alter table events_unpartitioned rename constraint events_pkey to events_unpartitioned_pkey;
+    alter sequence if exists events_id_seq rename to events_unpartitioned_id_seq;
+    create table events (
+      id bigserial,
+      kind text not null,
+      ref_id bigint,
+      note text,
+      payload_json jsonb,
+      created_at timestamptz not null default now(),
+      primary key (id, created_at)
+    ) partition by range (created_at);
+    create table events_default partition of events default;
+    -- 先建好近期月分區，舊資料才會落在 default、近期資料落在各月分區
+    perform ensure_events_partitions(3);
+    insert into events (id, kind, ref_id, note, payload_json, created_at)
+      select id, kind, ref_id, note, payload_json, coalesce(created_at, now()) from events_unpartitioned;
+    perform setval(pg_get_serial_sequence('events', 'id'), coalesce((select max(id) from events), 0) + 1, false);
+    -- 確認資料無誤後再手動：drop table events_unpartitioned;
+  end if;
+end $$;
+
+-- 落在已建立月份之外的資料先進 default 分區（避免 insert 失敗）
+create table if not exists events_default partition of events default;
+
+select ensure_events_partitions(3);
+
+-- 分區表上的索引會自動建立到每個分區
+create index if not exists events_kind_created_idx on events (kind, created_at);
+create index if not exists events_ref_id_idx on events (ref_id);
+
+-- 每日彙總：舊的聊天事件壓縮成一天一列，儀表板查長期趨勢只掃這張小表
+create table if not exists events_daily (
+  day date not null,
+  kind text not null,
+  events bigint not null default 0,
+  distinct_refs bigint not null default 0,   -- 有關聯 lead 的不重複數
+  payload_bytes bigint not null default 0,   -- 原始 payload 大小（估算節省的空間）
+  models jsonb not null default '{}'::jsonb, -- chat：各模型次數
+  primary key (day, kind)
 );
+
+-- 將 keep_days 天以前的 chat 事件彙總進 events_daily 後刪除；其他事件（提交 / 下載）保留明細
+create or replace function rollup_and_purge_events(keep_days int default 90)
+returns bigint language plpgsql as $$
+declare
+  cutoff timestamptz := date_trunc('day', now()) - make_interval(days => keep_days);
+  purged bigint;
+begin
+  with agg as (
+    select created_at::date as day, kind,
+           count(*) as events,
+           count(distinct ref_id) as distinct_refs,
+           coalesce(sum(pg_column_size(payload_json)), 0) as payload_bytes
+    from events
+    where kind = 'chat' and created_at < cutoff
+    group by 1, 2
+  ), per_model as (
+    select day, kind, jsonb_object_agg(model, n) as models
+    from (
+      select created_at::date as day, kind, payload_json->>'model' as model, count(*) as n
+      from events
+      where kind = 'chat' and created_at < cutoff and payload_json ? 'model'
+      group by 1, 2, 3
+    ) x
+    group by 1, 2
+  )
+  insert into events_daily as d (day, kind, events, distinct_refs, payload_bytes, models)
+  select a.day, a.kind, a.events, a.distinct_refs, a.payload_bytes, coalesce(m.models, '{}'::jsonb)
+  from agg a left join per_model m using (day, kind)
+  -- 正常情況每天只會彙總一次；補寫到舊日期的事件才會走到這裡（模型次數以新值覆蓋，其餘累加）
+  on conflict (day, kind) do update set
+    events = d.events + excluded.events,
+    distinct_refs = greatest(d.distinct_refs, excluded.distinct_refs),
+    payload_bytes = d.payload_bytes + excluded.payload_bytes,
+    models = d.models || excluded.models;
+
+  delete from events where kind = 'chat' and created_at < cutoff;
+  get diagnostics purged = row_count;
+  return purged;
+end $$;
+
+-- 儀表板用：已彙總的舊資料 + 近期明細即時彙總
+create or replace view events_daily_v as
+  select day, kind, events from events_daily
+  union all
+  select created_at::date as day, kind, count(*) as events
+  from events
+  where not (kind = 'chat' and created_at::date in (select day from events_daily where kind = 'chat'))
+  group by 1, 2;
+
+-- 排程（需在 Supabase 啟用 pg_cron extension）：每天凌晨補建分區並彙總/清理舊聊天事件
+-- 沒有排程時事件一樣寫得進去（落在 events_default），之後任何時候執行 ensure_events_partitions 都會把資料搬回月分區
+-- select cron.schedule('events-maintenance', '15 3 * * *',
+--   $$select ensure_events_partitions(3); select rollup_and_purge_events(90);$$);
@@ -0,0 +1,27 @@
+# tests/test_answer_cache.py — Copilot 問答快取：正規化與命中統計
+from src.copilot.answer_cache import AnswerCache, ngram_embedder, normalize_question
+
+PROMPT = "system"
+MODEL = "model"
+
+def test_decimal_point_is_kept():
+    assert normalize_question("1.5億要繳多少稅？") == "1.5億要繳多少稅"
+    assert normalize_question("１．５億要繳多少稅") == "1.5億要繳多少稅"
+    assert normalize_question("1.5億要繳多少稅") != normalize_question("15億要繳多少稅")
+
+def test_punctuation_and_fillers_are_ignored():
+    assert normalize_question("請問 先贈與，還是保單？") == normalize_question("先贈與還是保單")
+
+def test_amounts_differing_only_by_decimal_point_do_not_share_answers():
+    cache = AnswerCache()
+    cache.put("遺產 1.5億 要繳多少稅？", "A", system_prompt=PROMPT, model=MODEL)
+    assert cache.get("遺產 15億 要繳多少稅？", system_prompt=PROMPT, model=MODEL) == (None, "miss")
+    assert cache.get("遺產1.5億要繳多少稅", system_prompt=PROMPT, model=MODEL) == ("A", "exact")
+
+def test_semantic_lookup_counts_one_lru_access():
+    cache = AnswerCache(embedder=ngram_embedder, threshold=0.5)
+    cache.put("先贈與還是先買保單比較好", "A", system_prompt=PROMPT, model=MODEL)
+    answer, tier = cache.get("先贈與還是先買保單會比較好", system_prompt=PROMPT, model=MODEL)
+    assert (answer, tier) == ("A", "semantic")
+    lru = cache._exact.stats()
+    assert (lru.hits, lru.misses) == (0, 1)